@@ -0,0 +1,137 @@
+from datetime import datetime
+from flask import Blueprint, current_app, request, url_for, Response, stream_with_context
+from werkzeug.exceptions import HTTPException
+from models import Venue, Artist
+from exporter import EXPORTS, FORMATS, export_chunks
+from queries import decode_cursor
+from search import search_catalog
+from serializers import VenueSerializer, ArtistSerializer, ShowSerializer, dumps
+
+# Versioned JSON API, registered under /api/v1 in app.py.
+#
+# Listings take `?after=<cursor>&limit=<n>` (keyset pagination, like the HTML pages) and
+# `?fields=id,name` to choose the fields returned. Responses are encoded with orjson when
+# it is installed.
+
+api = Blueprint('api', __name__)
+
+
+class BadRequest(Exception):
+    pass
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype='application/json')
+
+
+def _serializer(serializer_class):
+    fields = request.args.get('fields')
+    try:
+        return serializer_class(fields.split(',') if fields else None)
+    except ValueError as e:
+        raise BadRequest(str(e))
+
+
+def _listing(serializer_class):
+    serializer = _serializer(serializer_class)
+    limit = request.args.get('limit', current_app.config['PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+    after = request.args.get('after')
+    try:
+        items, next_cursor = serializer.page(after=after and decode_cursor(after), limit=limit)
+    except ValueError as e:
+        raise BadRequest(str(e))
+    next_url = None
+    if next_cursor is not None:
+        args = request.args.to_dict()
+        args['after'] = next_cursor
+        next_url = url_for(request.endpoint, **args)
+    return json_response({"data": items, "next": next_url})
+
+
+def _detail(serializer_class, id):
+    item = _serializer(serializer_class).one(id)
+    if item is None:
+        return json_response({"error": "Not found"}, 404)
+    return json_response({"data": item})
+
+
+@api.errorhandler(BadRequest)
+def bad_request(error):
+    return json_response({"error": str(error)}, 400)
+
+
+@api.errorhandler(HTTPException)
+def http_error(error):
+    return json_response({"error": error.description}, error.code)
+
+
+@api.route('/venues')
+def venues():
+    return _listing(VenueSerializer)
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    return _detail(VenueSerializer, venue_id)
+
+
+@api.route('/artists')
+def artists():
+    return _listing(ArtistSerializer)
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    return _detail(ArtistSerializer, artist_id)
+
+
+@api.route('/shows')
+def shows():
+    return _listing(ShowSerializer)
+
+
+@api.route('/search')
+def search():
+    # /api/v1/search?type=venues|artists&q=<term>
+    models = {'venues': Venue, 'artists': Artist}
+    kind = request.args.get('type', 'venues')
+    if kind not in models:
+        raise BadRequest('type must be one of: venues, artists')
+    return json_response(search_catalog(models[kind], request.args.get('q', '').strip()))
+
+
+def _datetime_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise BadRequest(f'{name} must be an ISO 8601 date or datetime')
+
+
+@api.route('/export')
+def export():
+    # /api/v1/export?type=venues|artists|shows|venue_genres|artist_genres&format=csv|jsonl
+    #   &state=&from=&to=&updated_since=
+    # streamed as it is read, gzipped when the client accepts it
+    kind = request.args.get('type', 'venues')
+    if kind not in EXPORTS:
+        raise BadRequest('type must be one of: {}'.format(', '.join(EXPORTS)))
+    format = request.args.get('format', 'csv')
+    if format not in FORMATS:
+        raise BadRequest('format must be one of: {}'.format(', '.join(FORMATS)))
+    gzip = 'gzip' in request.accept_encodings
+    chunks = export_chunks(kind, format=format, gzip=gzip,
+                           state=request.args.get('state') or None,
+                           start_from=_datetime_arg('from'),
+                           start_to=_datetime_arg('to'),
+                           updated_since=_datetime_arg('updated_since'))
+    response = Response(stream_with_context(chunks),
+                        mimetype='text/csv' if format == 'csv' else 'application/x-ndjson')
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}.{format}'
+    if gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
@@ -2,9 +2,14 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import csv
+import io
 import json
 import dateutil.parser
 import babel
+from babel import Locale
+from babel.dates import parse_pattern, UTC as utc
+from functools import lru_cache
 from flask import (
   Flask,
   render_template,
@@ -13,19 +18,43 @@ from flask import (
   flash,
   redirect,
   url_for, abort,
-  jsonify
+  jsonify,
+  stream_with_context,
+  has_request_context
 )
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
-from datetime import datetime
+from datetime import datetime, timedelta
 from forms import *
-from operator import itemgetter
 from flask_migrate import Migrate
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 import re
 from models import db, Venue, Artist, Show, Genre
+from queries import venue_areas, artists_page, shows_page, venue_shows, artist_shows, past_shows_page, decode_cursor
+from queries import venues_version, artists_version, shows_version, venue_version, artist_version
+from queries import iter_venue_areas, iter_artists, iter_shows, show_calendar, area_venue_ids
+from search import search_catalog, get_search_backend
+from genres import resolve_genres
+from cache import cached_page, add_cache_tags, invalidate, area_tag, get_cache
+from conditional import conditional_page
+from api import api
+from importer import import_command, bulk_create_shows
+from exporter import export_command
+from summary import summary_cli
+from counters import shows_added, counters_cli
+from booking import check_bookings, describe_conflict, conflicts_command
+import instrumentation
+import metrics
+import jobs
+from jobs import enqueue, worker_command
+from versions import bump_versions, venue_pages, artist_pages
+from metrics import pool_stats
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -37,21 +66,147 @@ app.config.from_object('config')
 db.init_app(app)
 # connect to a local postgresql database
 migrate = Migrate(app, db)
+app.register_blueprint(api, url_prefix='/api/v1')
+app.cli.add_command(import_command)
+app.cli.add_command(export_command)
+app.cli.add_command(summary_cli)
+app.cli.add_command(counters_cli)
+app.cli.add_command(conflicts_command)
+app.cli.add_command(worker_command)
+instrumentation.init_app(app)
+metrics.init_app(app)
+jobs.init_app(app)
+
+@event.listens_for(Session, 'after_begin')
+def statement_timeout(session, transaction, connection):
+  # every transaction of a web request gets the timeout, CLI commands and jobs scan whole tables
+  timeout = app.config.get('DB_STATEMENT_TIMEOUT')
+  if timeout and has_request_context() and connection.dialect.name == 'postgresql':
+    connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+  # parsing the CLDR pattern and loading the locale data is the expensive part, do it once
+  return parse_pattern(format), Locale.parse(locale)
+
+@lru_cache(maxsize=4096)
+def format_datetime_cached(value, format, locale):
+  # the same start times show up over and over on /shows and the detail pages
+  pattern, locale = datetime_pattern(format, locale)
+  if value.tzinfo is None:
+    # babel treats naive datetimes as UTC
+    value = value.replace(tzinfo=utc)
+  return pattern.apply(value, locale)
+
+def format_datetime(value, format='medium', locale='en'):
+  # views pass datetimes, strings are still accepted
+  if isinstance(value, str):
+    value = dateutil.parser.parse(value)
+  format = DATETIME_FORMATS.get(format, format)
+  return format_datetime_cached(value, format, locale)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+def page_args():
+  # reads the keyset pagination arguments (?after=<cursor>&limit=<n>) of a listing page
+  limit = request.args.get('limit', app.config['PAGE_SIZE'], type=int)
+  limit = max(1, min(limit, app.config['MAX_PAGE_SIZE']))
+  after = request.args.get('after')
+  if after:
+    try:
+      after = decode_cursor(after)
+    except ValueError:
+      abort(400)
+  else:
+    after = None
+  return after, limit
+
+def past_shows_response(model, id, endpoint, **view_args):
+  # reads one page of past shows for the /<venues|artists>/<id>/past_shows endpoints,
+  # returns the rows and the url of the following page
+  limit = request.args.get('limit', app.config['PAST_SHOWS_LIMIT'], type=int)
+  limit = max(1, min(limit, app.config['MAX_PAGE_SIZE']))
+  before = request.args.get('before')
+  try:
+    shows, next_cursor = past_shows_page(model, id, before=before and decode_cursor(before), limit=limit)
+  except ValueError:
+    abort(400)
+  next_url = None
+  if next_cursor is not None:
+    next_url = url_for(endpoint, before=next_cursor, limit=limit, format=request.args.get('format'), **view_args)
+  return shows, next_url
+
+def stream_template(template_name, **context):
+  # renders the template while the response is sent instead of building the whole page first,
+  # context values can be generators that are consumed as the template reaches them
+  app.update_template_context(context)
+  template = app.jinja_env.get_template(template_name)
+  stream = template.stream(context)
+  # send the page in chunks of a few template events rather than per event
+  stream.enable_buffering(app.config['STREAM_BUFFER_SIZE'])
+  return Response(stream_with_context(stream), mimetype='text/html')
+
+def is_streaming():
+  # ?stream=1 serves the full, unpaginated listing as a streamed response
+  return request.args.get('stream') == '1'
+
+def date_range_args():
+  # ?from=&to= as ISO dates or datetimes, `to` is excluded unless it is a date (the whole day is included)
+  values = []
+  for name in ('from', 'to'):
+    value = request.args.get(name)
+    if not value:
+      values.append(None)
+      continue
+    try:
+      parsed = datetime.fromisoformat(value)
+    except ValueError:
+      abort(400)
+    if name == 'to' and len(value) == 10:
+      parsed += timedelta(days=1)
+    values.append(parsed)
+  return tuple(values)
+
+def month_arg():
+  # ?month=YYYY-MM (default: the current month) as (first day, first day of the next month, 'YYYY-MM')
+  month = request.args.get('month') or datetime.now().strftime('%Y-%m')
+  try:
+    start = datetime.strptime(month, '%Y-%m')
+  except ValueError:
+    abort(400)
+  end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+  return start, end, month
+
+def show_filter_args():
+  # filters of the /shows listing: ?from=&to=&state=&genre=
+  start_from, start_to = date_range_args()
+  return {
+    "start_from": start_from,
+    "start_to": start_to,
+    "state": request.args.get('state') or None,
+    "genre": request.args.get('genre') or None,
+  }
+
+def next_page_url(next_cursor):
+  if next_cursor is None:
+    return None
+  args = request.args.to_dict()
+  args['after'] = next_cursor
+  return url_for(request.endpoint, **args)
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -65,107 +220,62 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@conditional_page(venues_version)
+@cached_page('venues')
 def venues():
-  # getting all data from Venues Table
-  venues = Venue.query.all()
-  if len(venues) == 0:
+  # venues grouped by city/state with their upcoming show count, computed in a single query
+  if is_streaming():
+    return stream_template('pages/venues.html', areas=iter_venue_areas())
+  after, limit = page_args()
+  try:
+    data, next_cursor = venue_areas(after=after, limit=limit)
+  except ValueError:
+    abort(400)
+  if len(data) == 0 and after is None:
     flash('There are no Venues :(, add some Venue data')
     return redirect(url_for('index'))
-  cities_and_states = set()
-  for venue in venues:
-    cities_and_states.add( (venue.city, venue.state) )  # Add tuple, we are using set so that duplicate values wont be added in it. So our pair of City and states would be unique in Set.
-  cities_and_states = list(cities_and_states)
-  cities_and_states.sort(key=itemgetter(1,0))     # Sorts on second column first (state), then by city.
-  now = datetime.now()
-
-  for location in cities_and_states:
-      # For this location, see if there are any venues there
-      venues_list = []
-      for venue in venues:
-          if (venue.city == location[0]) and (venue.state == location[1]):
-
-              # If we've got a venue to add, check how many upcoming shows it has
-              venue_shows = Show.query.filter_by(venue_id=venue.id).all()
-              num_upcoming = 0
-              for show in venue_shows:
-                  if show.start_time > now:
-                      num_upcoming += 1
-
-              venues_list.append({
-                  "id": venue.id,
-                  "name": venue.name,
-                  "num_upcoming_shows": num_upcoming
-              })
-      data = []
-      data.append({
-          "city": location[0],
-          "state": location[1],
-          "venues": venues_list
-      })
-  return render_template('pages/venues.html', areas=data)
-
-
-# resource for below pattern match : https://stackoverflow.com/questions/20363836/postgresql-ilike-query-with-sqlalchemy
+  add_cache_tags(*[area_tag(area["city"], area["state"]) for area in data])
+  return render_template('pages/venues.html', areas=data, next_url=next_page_url(next_cursor))
+
+
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
-  search_term =  request.form.get('search_term', '').strip()
-  regEx = '%' + search_term + '%'
-  # filtering out the searched text
-  venues = Venue.query.filter(Venue.name.ilike(regEx)).all()
-  # print(venues)
-  # storing current time , so that we can have a list of upcoming and past shows based on the time and date of the show
-  current_time = datetime.now()
-  shows_data = []
-  all_shows = Show.query.all()
-  for venue in venues:
-    all_shows = Show.query.filter_by(venue_id=venue.id).all()
-    upcomingShow = 0
-    for show in all_shows:
-      if show.start_time > current_time:
-        upcomingShow += 1
-    shows_data.append({
-      "id": venue.id,
-      "name": venue.name,
-      "num_upcoming_shows": upcomingShow
-    })
-  response = {
-    "count": len(venues),
-    "data": shows_data
-  }
-
+  # partial, case-insensitive name search, see search.py for the backends
+  search_term = request.form.get('search_term', '').strip()
+  response = search_catalog(Venue, search_term)
   return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/venues/<int:venue_id>')
+@conditional_page(venue_version)
+@cached_page(lambda args: f"venue:{args['venue_id']}")
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-
-  # venue = Venue.query.get(venue_id)
-  venue = Venue.query.first_or_404(venue_id)
+  # the venue and its genres come from one joined query, its shows from a second one
+  venue = Venue.query.options(joinedload(Venue.genres)).get_or_404(venue_id)
   genre_list = []
   # genre has to be sent as a list in the Object
   for genre in venue.genres:
     genre_list.append(genre.name)
-  upcoming_shows_query = db.session.query(Show).join(Artist).filter(Show.venue_id==venue_id).filter(Show.start_time>datetime.now()).all()
-  upcoming_shows = []
-
-  past_shows_query = db.session.query(Show).join(Artist).filter(Show.venue_id==venue_id).filter(Show.start_time<datetime.now()).all()
+  # only the most recent past shows are on the page, older ones are loaded from /venues/<id>/past_shows
+  past_shows_query, upcoming_shows_query, past_cursor = \
+    venue_shows(venue_id, past_limit=app.config['PAST_SHOWS_LIMIT'])
   past_shows = []
+  upcoming_shows = []
 
   for show in past_shows_query:
     past_shows.append({
       "artist_id": show.artist_id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": str(show.start_time)
+      "artist_name": show.artist_name,
+      "artist_image_link": show.artist_image_link,
+      "start_time": show.start_time
     })
 
   for show in upcoming_shows_query:
     upcoming_shows.append({
       "artist_id": show.artist_id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": str(show.start_time)   
+      "artist_name": show.artist_name,
+      "artist_image_link": show.artist_image_link,
+      "start_time": show.start_time
     })
 
   data = {
@@ -182,15 +292,59 @@ def show_venue(venue_id):
     "seeking_description": venue.seeking_description,
     "image_link": venue.image_link,
     "past_shows": past_shows,
-    "past_shows_count": len(past_shows),
+    "past_shows_count": venue.past_shows_count,
+    "past_shows_next_url": past_cursor and url_for('venue_past_shows', venue_id=venue_id, before=past_cursor, format='html'),
     "upcoming_shows": upcoming_shows,
     "upcoming_shows_count": len(upcoming_shows)
   }
+  # the page also shows the names and images of the artists playing there
+  add_cache_tags(*[f'artist:{show["artist_id"]}' for show in past_shows + upcoming_shows])
   return render_template('pages/show_venue.html', venue=data)
 
+@app.route('/venues/<int:venue_id>/past_shows')
+@conditional_page(venue_version)
+@cached_page(lambda args: f"venue:{args['venue_id']}")
+def venue_past_shows(venue_id):
+  # older past shows of a venue, page by page, for the "Older shows" button of the venue page
+  shows, next_url = past_shows_response(Venue, venue_id, 'venue_past_shows', venue_id=venue_id)
+  data = []
+  for show in shows:
+    data.append({
+      "artist_id": show.artist_id,
+      "artist_name": show.artist_name,
+      "artist_image_link": show.artist_image_link,
+      "start_time": show.start_time
+    })
+  add_cache_tags(*[f'artist:{show["artist_id"]}' for show in data])
+  if request.args.get('format') == 'html':
+    return render_template('pages/venue_past_shows.html', shows=data, next_url=next_url)
+  for show in data:
+    show["start_time"] = show["start_time"].isoformat()
+  return jsonify({"shows": data, "next": next_url})
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
+@app.route('/venues/<int:venue_id>/calendar')
+def venue_calendar(venue_id):
+  # number of shows per day of ?month=YYYY-MM, for a month view
+  start, end, month = month_arg()
+  if not db.session.query(Venue.id).filter(Venue.id == venue_id).first():
+    abort(404)
+  days = show_calendar(Show.venue_id, [venue_id], start, end)[venue_id]
+  return jsonify({"venue_id": venue_id, "month": month, "days": days, "total": sum(days.values())})
+
+@app.route('/venues/calendar')
+def area_calendar():
+  # per-day show counts of every venue of a ?city=&state= for ?month=, from one grouped query
+  city, state = request.args.get('city'), request.args.get('state')
+  if not city or not state:
+    abort(400)
+  start, end, month = month_arg()
+  calendar = show_calendar(Show.venue_id, area_venue_ids(city, state), start, end)
+  return jsonify({"city": city, "state": state, "month": month,
+                  "venues": {str(id): days for id, days in calendar.items()}})
+
 @app.route('/venues/create', methods=['GET'])
 def create_venue_form():
   form = VenueForm()
@@ -215,8 +369,6 @@ def create_venue_submission():
   website = form.website.data.strip()
   facebook_link = form.facebook_link.data.strip()
 
-  insertedGenres = Venue.query.all()
-
   if not form.validate():
     flash( form.errors )
     return redirect(url_for('create_venue_submission'))
@@ -229,20 +381,18 @@ def create_venue_submission():
         new_venue = Venue(name=name, city=city, state=state, address=address, phone=phone, \
             seeking_talent=seeking_talent, seeking_description=seeking_description, image_link=image_link, \
             website=website, facebook_link=facebook_link)
-        foundElement = False
-        for genre in genres:
-          found_genre = Genre.query.filter_by(name=genre).one_or_none()
-          if found_genre:
-              # if found a genre, append it to the list
-              new_venue.genres.append(found_genre)
-
-          else:
-              # found_genre was None. It's not created yet, so create it
-              new_genre = Genre(name=genre)
-              db.session.add(new_genre)
-              new_venue.genres.append(new_genre)  # Create a new Genre item and append it
+        # existing genres are looked up in one query, missing ones created in one insert (see genres.py)
+        new_venue.genres = resolve_genres(genres)
         db.session.add(new_venue)
+        db.session.flush()
+        new_venue_id = new_venue.id
+        # the listing shows the summary row, invalidated again once it is written
+        enqueue('refresh_venues', venue_ids=[new_venue_id], tags=['venues'])
         db.session.commit()
+        # a new venue shifts the venue listing pages
+        invalidate('venues')
+        # the ngram index lives in this process, not in the database: updated here, not by a job
+        get_search_backend().index_document(Venue, new_venue_id, name)
     except Exception as e:
       flash(f'Exception "{e}" in create_venue_submission()')
       error_in_insert = True
@@ -268,9 +418,15 @@ def delete_venue(venue_id):
   status = False
   try:
     db.session.delete(venue)
+    db.session.flush()
+    enqueue('refresh_venues', venue_ids=[int(venue_id)], tags=['venues'])
+    bump_versions(f'venue:{venue_id}', 'shows')
     db.session.commit()
+    invalidate('venues', f'venue:{venue_id}', 'shows')
+    get_search_backend().remove_document(Venue, int(venue_id))
     status = True
   except:
+    db.session.rollback()
     status = False
   if status:
     flash('Successfully deleted the Venue')
@@ -278,14 +434,22 @@ def delete_venue(venue_id):
     flash('Deletion Failed, Please try again!')
   # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
   # clicking that button delete it from the db then redirect the user to the homepage
-  return None
+  return jsonify({"success": status})
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@conditional_page(artists_version)
+@cached_page('artists')
 def artists():
-  artists = Artist.query.all()
-  if len(artists) == 0:
+  if is_streaming():
+    return stream_template('pages/artists.html', artists=iter_artists())
+  after, limit = page_args()
+  try:
+    artists, next_cursor = artists_page(after=after, limit=limit)
+  except ValueError:
+    abort(400)
+  if len(artists) == 0 and after is None:
     flash('There are no Artists :(, add some Artist data')
     return redirect(url_for('index'))
   data = []
@@ -294,65 +458,47 @@ def artists():
       "id": artist.id,
       "name": artist.name
     })
-  return render_template('pages/artists.html', artists=data)
+  return render_template('pages/artists.html', artists=data, next_url=next_page_url(next_cursor))
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
   # lets stripm the search string before use
   search_term = request.form.get('search_term', '').strip()
-  # using ilike to match pattern
-  artists = Artist.query.filter(Artist.name.ilike('%' + search_term + '%')).all()
-  for artist in artists:
-    shows = Show.query.filter_by(artist_id=artist.id).all()
-    upcoming_shows = 0
-    for show in shows:
-      if show.start_time > datetime.now():
-        upcoming_shows += 1
-  searched_artists = []
-  searched_artists.append({ 
-    "id": artist.id,
-    "name": artist.name,
-    "num_upcoming_shows": upcoming_shows
-  })
-
-  response={
-    "count": len(artists),
-    "data": searched_artists
-  }
+  response = search_catalog(Artist, search_term)
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/artists/<int:artist_id>')
+@conditional_page(artist_version)
+@cached_page(lambda args: f"artist:{args['artist_id']}")
 def show_artist(artist_id):
-  # using get function to retrieve the artist
-  artist = Artist.query.get(artist_id)
+  # the artist and its genres come from one joined query, its shows from a second one
+  artist = Artist.query.options(joinedload(Artist.genres)).get_or_404(artist_id)
   genre_list = []
   # genre list has to be sent as List
   for genre in artist.genres:
     genre_list.append(genre.name)
-
-  past_shows_query = db.session.query(Show).join(Venue).filter(Show.artist_id==artist_id).filter(Show.start_time>datetime.now()).all()
+  # only the most recent past shows are on the page, older ones are loaded from /artists/<id>/past_shows
+  past_shows_query, upcoming_shows_query, past_cursor = \
+    artist_shows(artist_id, past_limit=app.config['PAST_SHOWS_LIMIT'])
   past_shows = []
+  upcoming_shows = []
 
   for show in past_shows_query:
     past_shows.append({
       "venue_id": show.venue_id,
-      "venue_name": show.venue.name,
-      "artist_image_link": show.venue.image_link,
-      "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
+      "venue_name": show.venue_name,
+      "venue_image_link": show.venue_image_link,
+      "start_time": show.start_time
     })
 
-  upcoming_shows_query = db.session.query(Show).join(Venue).filter(Show.artist_id==artist_id).filter(Show.start_time>datetime.now()).all()
-  upcoming_shows = []
-
   for show in upcoming_shows_query:
     upcoming_shows.append({
       "venue_id": show.venue_id,
-      "venue_name": show.venue.name,
-      "artist_image_link": show.venue.image_link,
-      "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
+      "venue_name": show.venue_name,
+      "venue_image_link": show.venue_image_link,
+      "start_time": show.start_time
     })
   data = {
     "id": artist.id,
@@ -367,13 +513,46 @@ def show_artist(artist_id):
     "seeking_description": artist.seeking_description,
     "image_link": artist.image_link,
     "past_shows": past_shows,
+    "past_shows_next_url": past_cursor and url_for('artist_past_shows', artist_id=artist_id, before=past_cursor, format='html'),
     "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
+    "past_shows_count": artist.past_shows_count,
     "upcoming_shows_count": len(upcoming_shows)
   }
   # data = list(filter(lambda d: d['id'] == artist_id, [data1, data2, data3]))[0]
+  # the page also shows the names and images of the venues the artist plays at
+  add_cache_tags(*[f'venue:{show["venue_id"]}' for show in past_shows + upcoming_shows])
   return render_template('pages/show_artist.html', artist=data)
 
+@app.route('/artists/<int:artist_id>/calendar')
+def artist_calendar(artist_id):
+  # number of shows per day of ?month=YYYY-MM, for a month view
+  start, end, month = month_arg()
+  if not db.session.query(Artist.id).filter(Artist.id == artist_id).first():
+    abort(404)
+  days = show_calendar(Show.artist_id, [artist_id], start, end)[artist_id]
+  return jsonify({"artist_id": artist_id, "month": month, "days": days, "total": sum(days.values())})
+
+@app.route('/artists/<int:artist_id>/past_shows')
+@conditional_page(artist_version)
+@cached_page(lambda args: f"artist:{args['artist_id']}")
+def artist_past_shows(artist_id):
+  # older past shows of an artist, page by page, for the "Older shows" button of the artist page
+  shows, next_url = past_shows_response(Artist, artist_id, 'artist_past_shows', artist_id=artist_id)
+  data = []
+  for show in shows:
+    data.append({
+      "venue_id": show.venue_id,
+      "venue_name": show.venue_name,
+      "venue_image_link": show.venue_image_link,
+      "start_time": show.start_time
+    })
+  add_cache_tags(*[f'venue:{show["venue_id"]}' for show in data])
+  if request.args.get('format') == 'html':
+    return render_template('pages/artist_past_shows.html', shows=data, next_url=next_url)
+  for show in data:
+    show["start_time"] = show["start_time"].isoformat()
+  return jsonify({"shows": data, "next": next_url})
+
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
@@ -418,6 +597,7 @@ def edit_artist_submission(artist_id):
   image_link = form.image_link.data.strip()
   website_link = form.website_link.data.strip()
   facebook_link = form.facebook_link.data.strip()
+  error_occured = False
   # Insert form data into DB
   try:
     # First get the existing artist object
@@ -436,21 +616,17 @@ def edit_artist_submission(artist_id):
     artist.image_link = image_link
     artist.website_link = website_link
     artist.facebook_link = facebook_link
-    # deleting the genres , to update it again with the new values
-    artist.genres = []
-    # Basically what we are doing in the below code is, from new Genre list, we are checking if they are inn the Genre table, if not, we are creating them , and subsequently adding them to the Artist Object
-    for genre in genres:
-        genre_found = Genre.query.filter_by(name=genre).one_or_none()
-        if genre_found:
-            artist.genres.append(genre_found)
-        else:
-            # creating new Genre , if it does not exist
-            new_genre = Genre(name=genre)
-            db.session.add(new_genre)
-            artist.genres.append(new_genre)  # Create a new Genre item and append it
+    # replacing the genres with the new list, missing genres are created (see genres.py)
+    artist.genres = resolve_genres(genres)
+    # genres live in another table, bump updated_at even if only they changed
+    artist.updated_at = datetime.utcnow()
 
+    bump_versions('artists', 'shows', *artist_pages(artist_id))
     # Attempt to save everything
     db.session.commit()
+    # the artist's name and image also appear on the artist listing, the shows and its venues' pages
+    invalidate('artists', f'artist:{artist_id}', 'shows')
+    get_search_backend().index_document(Artist, artist_id, name)
   except:
       error_occured = True
       db.session.rollback()
@@ -505,25 +681,21 @@ def edit_venue_submission(venue_id):
       venue.image_link = form.image_link.data.strip()
       venue.website = form.website.data.strip()
       venue.facebook_link = form.facebook_link.data.strip()
-      foundElement = False
 
       error_occured = False
       genres = form.genres.data
-      venue.genres = []
-      # db.session.add(venue)
-      # db.session.commit()
-      i = 0
-      for genre in genres:
-        genre_found = Genre.query.filter_by(name=genre).one_or_none()
-
-        if genre_found:
-          venue.genres.append(genre_found)
-        else:
-          new_genre = Genre(name=genre)
-          db.session.add(new_genre)
-          venue.genres.append(new_genre)
+      # replacing the genres with the new list, missing genres are created (see genres.py)
+      venue.genres = resolve_genres(genres)
+      # genres live in another table, bump updated_at even if only they changed
+      venue.updated_at = datetime.utcnow()
       db.session.add(venue)
+      db.session.flush()
+      enqueue('refresh_venues', venue_ids=[venue_id], tags=['venues'])
+      bump_versions('shows', *venue_pages(venue_id))
       db.session.commit()
+      # name, city and state appear on the venue listing, the shows and its artists' pages
+      invalidate('venues', f'venue:{venue_id}', 'shows')
+      get_search_backend().index_document(Venue, venue_id, form.name.data.strip())
   except:
       error_occured = True
       db.session.rollback()
@@ -564,29 +736,21 @@ def create_artist_submission():
   image_link = form.image_link.data.strip()
   website_link = form.website_link.data.strip()
   facebook_link = form.facebook_link.data.strip()
-  # getting Artist Genres
-  insertedGenres = Genre.query.all()
 
   error_occured = False
   # Insert form data into DB
   try:
     # creating new Artist
     new_artist = Artist(name=name, city=city, state=state, phone=phone, seeking_venue=seeking_venue, seeking_description=seeking_description, image_link=image_link, website_link=website_link, facebook_link=facebook_link)
-    foundElement = False # Createing a variable to check if the Genre is already present in the Genre Table
-    # Basically what we are doing in the below code is, from new Genre list, we are checking if they are inn the Genre table, if not, we are creating them , and subsequently adding them to the Artist Object
-    for genre in genres:
-      genre_found = Genre.query.filter_by(name=genre).one_or_none()
-      if genre_found:
-          # if found a genre, append it to the list
-          new_artist.genres.append(genre_found)
-
-      else:
-          # genre_found was None. It's not created yet, so create it
-          new_genre = Genre(name=genre)
-          db.session.add(new_genre)
-          new_artist.genres.append(new_genre)  # Create a new Genre item and append it
+    # existing genres are looked up in one query, missing ones created in one insert (see genres.py)
+    new_artist.genres = resolve_genres(genres)
     db.session.add(new_artist)
+    db.session.flush()
+    new_artist_id = new_artist.id
+    bump_versions('artists')
     db.session.commit()
+    invalidate('artists')
+    get_search_backend().index_document(Artist, new_artist_id, name)
   except:
       error_occured = True
       db.session.rollback()
@@ -607,28 +771,21 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@conditional_page(shows_version)
+@cached_page('shows')
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  shows = Show.query.all()
+  # upcoming shows by start time, or the shows of ?from=&to= (ISO dates or datetimes),
+  # optionally at venues of a ?state= or by artists of a ?genre=,
+  # read from one join of Show, Venue and Artist with only the rendered columns
+  filters = show_filter_args()
+  if is_streaming():
+    return stream_template('pages/shows.html', shows=iter_shows(**filters))
+  after, limit = page_args()
   try:
-    data = []
-    for show in shows:
-      artist = show.artist
-      venue = show.venue
-      data.append({
-        "venue_id": show.venue_id,
-        "venue_name": venue.name,
-        "artist_id": artist.id,
-        "artist_name": artist.name,
-        "artist_image_link": artist.image_link,
-        "start_time": str(show.start_time)
-      })
-  except:
-    flash('Something went Wrong')
-    return redirect(url_for('index'))
-  return render_template('pages/shows.html', shows=data)
+    shows, next_cursor = shows_page(after=after, limit=limit, **filters)
+  except ValueError:
+    abort(400)
+  return render_template('pages/shows.html', shows=shows, next_url=next_page_url(next_cursor))
 
 @app.route('/shows/create')
 def create_shows():
@@ -644,19 +801,48 @@ def create_show_submission():
   venue_id = form.venue_id.data.strip()
   start_time = form.start_time.data
 
+  if not form.duration.validate(form):
+    flash(f'Duration: {form.duration.errors[0]}')
+    return render_template('forms/new_show.html', form=form)
+  duration = timedelta(minutes=form.duration.data or form.duration.default)
+
   error_found = False
-  
+  conflicts = []
+
   try:
-      new_show = Show(start_time=start_time, artist_id=artist_id, venue_id=venue_id)
-      db.session.add(new_show)
-      db.session.commit()
-  except:
+      end_time = start_time + duration
+      conflicts = check_bookings([(int(venue_id), int(artist_id), start_time, end_time)])[0]
+      if not conflicts:
+        new_show = Show(start_time=start_time, end_time=end_time, artist_id=artist_id, venue_id=venue_id)
+        db.session.add(new_show)
+        venue = db.session.query(Venue.city, Venue.state).filter(Venue.id == venue_id).one()
+        db.session.flush()
+        shows_added([(new_show.venue_id, new_show.artist_id, new_show.is_past)])
+        # only the venue's area on the venue listing changes (its upcoming show count)
+        area = area_tag(venue.city, venue.state)
+        enqueue('refresh_venues', venue_ids=[int(venue_id)], tags=[area])
+        bump_versions('shows', f'venue:{venue_id}', f'artist:{artist_id}')
+        db.session.commit()
+        invalidate('shows', f'venue:{venue_id}', f'artist:{artist_id}', area)
+  except IntegrityError as e:
+      db.session.rollback()
+      if 'ex_Show_' in str(e.orig):
+        # booked by a concurrent request since the check, caught by the Postgres constraints
+        conflicts = [e]
+      else:
+        error_found = True
+        print(f'Error "{e}" , please try Again')
+  except Exception as e:
       error_found = True
       print(f'Error "{e}" , please try Again')
       db.session.rollback()
   finally:
       db.session.close()
 
+  if conflicts:
+    reason = describe_conflict(conflicts[0]) if isinstance(conflicts[0], dict) else 'it overlaps another show'
+    flash(f'Show could not be booked, {reason}')
+    return render_template('forms/new_show.html', form=form)
   if error_found:
       flash('Error Occured')
   else:
@@ -664,6 +850,88 @@ def create_show_submission():
   
   return render_template('pages/home.html')
 
+# one show per row: JSON objects with the show form fields, or lines of the bulk form
+BULK_SHOW_FIELDS = ('artist_id', 'venue_id', 'start_time', 'duration')
+
+@app.route('/shows/bulk', methods=['GET'])
+def bulk_shows():
+  form = BulkShowForm()
+  return render_template('forms/bulk_shows.html', form=form)
+
+@app.route('/shows/bulk', methods=['POST'])
+def bulk_shows_submission():
+  # a whole tour in one request: ids checked with one IN query per side, all the shows
+  # inserted in one transaction (see importer.bulk_create_shows), a result per row
+  max_rows = app.config['BULK_SHOWS_MAX_ROWS']
+  if request.is_json:
+    data = request.get_json(silent=True)
+    rows = data.get('shows') if isinstance(data, dict) else data
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+      return jsonify({"error": "Expected a list of shows"}), 400
+    if len(rows) > max_rows:
+      return jsonify({"error": f"At most {max_rows} shows per request"}), 400
+  else:
+    form = BulkShowForm()
+    if not form.validate():
+      flash('Enter one show per line')
+      return render_template('forms/bulk_shows.html', form=form)
+    rows = [{name: (value or '').strip() for name, value in row.items() if name in BULK_SHOW_FIELDS}
+            for row in csv.DictReader(io.StringIO(form.shows.data), fieldnames=BULK_SHOW_FIELDS)]
+    if len(rows) > max_rows:
+      flash(f'At most {max_rows} shows per upload')
+      return render_template('forms/bulk_shows.html', form=form)
+
+  try:
+    results = bulk_create_shows(rows)
+  except Exception as e:
+    db.session.rollback()
+    app.logger.error(f'Bulk show creation failed: {e}')
+    if request.is_json:
+      return jsonify({"error": "Shows could not be created"}), 500
+    flash('Error Occured')
+    return render_template('forms/bulk_shows.html', form=form)
+  finally:
+    db.session.close()
+
+  created = [result for result in results if 'id' in result]
+  if created:
+    venues = db.session.query(Venue.id, Venue.city, Venue.state) \
+      .filter(Venue.id.in_({int(rows[result['row'] - 1]['venue_id']) for result in created})).all()
+    artist_ids = {int(rows[result['row'] - 1]['artist_id']) for result in created}
+    db.session.close()
+    invalidate('shows', *(f'venue:{venue.id}' for venue in venues), *(f'artist:{id}' for id in artist_ids),
+               *{area_tag(venue.city, venue.state) for venue in venues})
+  summary = {"created": len(created), "rejected": len(results) - len(created)}
+  if request.is_json:
+    return jsonify(dict(summary, results=results))
+  flash(f'{summary["created"]} shows created, {summary["rejected"]} rejected')
+  return render_template('forms/bulk_shows.html', form=form, results=results)
+
+#  Health
+#  ----------------------------------------------------------------
+
+@app.route('/healthz')
+def healthz():
+  # liveness of the app and its database for load balancers, with pool checkout stats
+  data = pool_stats()
+  data["cache"] = get_cache().stats()
+  try:
+    db.session.execute(text('SELECT 1'))
+    data["database"] = "ok"
+    status = 200
+  except Exception as e:
+    app.logger.error(f'Health check failed: {e}')
+    data["database"] = "unavailable"
+    status = 503
+  finally:
+    db.session.close()
+  return jsonify(data), status
+
+@app.route('/metrics')
+def metrics_endpoint():
+  # Prometheus scrape target, see metrics.py
+  return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
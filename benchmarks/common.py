@@ -0,0 +1,96 @@
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Shared setup of the benchmark scripts: the app on a database the scripts can drop and
+# recreate tables in (BENCH_DATABASE_URL, a throwaway SQLite file by default, never the
+# DATABASE_URL of the app) and a seeded catalog written with Core executemany.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def setup_app(engine_options=None):
+    """Imports the app configured for benchmarking, returns it inside a pushed app context
+    with empty tables."""
+    url = os.environ.get('BENCH_DATABASE_URL') or \
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='fyyur-bench-'), 'fyyur.db')
+    # read by config.py when app.py is imported
+    os.environ['DATABASE_URL'] = url
+    os.environ.setdefault('CACHE_BACKEND', 'none')
+    os.environ.setdefault('JOB_WORKER_IN_PROCESS', '0')
+    os.environ.setdefault('INSTRUMENTATION_ENABLED', '0')
+    from app import app
+    from models import db
+    if engine_options:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'], **engine_options)
+    app.logger.disabled = True
+    app.app_context().push()
+    db.drop_all()
+    db.create_all()
+    return app
+
+
+def seed(venues, artists, shows, now=None, batch_size=10000):
+    """Adds `venues` venues in 50 areas, `artists` artists and `shows` shows, half of them
+    in the past. The shows of a venue are a week apart and the artists of a week all
+    different (artists >= venues), so none overlap. Then brings the summary table and
+    counters up to date."""
+    from models import db, Venue, Artist, Show, Genre, venue_genre_relation, artist_genre_relation
+    from summary import rebuild
+    from counters import check
+    if artists < venues:
+        raise ValueError('Need at least as many artists as venues')
+    if now is None:
+        now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    genres = ['Jazz', 'Rock', 'Folk', 'Blues', 'Classical', 'Hip-Hop', 'Swing', 'Reggae']
+    db.session.execute(Genre.__table__.insert(), [{'id': i + 1, 'name': name} for i, name in enumerate(genres)])
+    db.session.execute(Venue.__table__.insert(), [
+        {'id': i + 1, 'name': f'Venue {i}', 'city': f'City {i % 50}', 'state': ('CA', 'NY', 'TX', 'WA')[i % 4],
+         'address': f'{i} Main St', 'updated_at': datetime.utcnow()} for i in range(venues)])
+    db.session.execute(Artist.__table__.insert(), [
+        {'id': i + 1, 'name': f'Artist {i}', 'city': f'City {i % 50}', 'state': ('CA', 'NY', 'TX', 'WA')[i % 4],
+         'image_link': f'https://img.example/{i}.jpg', 'updated_at': datetime.utcnow()} for i in range(artists)])
+    db.session.execute(venue_genre_relation.insert(),
+                       [{'venue_id': i + 1, 'genre_id': i % len(genres) + 1} for i in range(venues)])
+    db.session.execute(artist_genre_relation.insert(),
+                       [{'artist_id': i + 1, 'genre_id': i % len(genres) + 1} for i in range(artists)])
+    # show i: venue i % venues in time slot i // venues, the artists of a slot are all different
+    slots = (shows + venues - 1) // venues
+    first = now - timedelta(days=7 * (slots // 2))
+    batch = []
+    for i in range(shows):
+        slot, venue = divmod(i, venues)
+        # venues start at different hours of the day
+        start = first + timedelta(days=7 * slot, hours=venue % 12)
+        batch.append({'venue_id': venue + 1, 'artist_id': (venue + slot) % artists + 1,
+                      'start_time': start, 'end_time': start + timedelta(hours=2),
+                      'is_past': start <= now, 'updated_at': datetime.utcnow()})
+        if len(batch) == batch_size:
+            db.session.execute(Show.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Show.__table__.insert(), batch)
+    db.session.commit()
+    rebuild()
+    db.session.commit()
+    check(fix=True)
+
+
+def timed(fn, repeat=20):
+    """Runs fn() `repeat` times (after one warm-up run), returns the median seconds."""
+    fn()
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
@@ -0,0 +1,117 @@
+"""Query plans and timings of the hot read queries without and with the indexes of
+migration 7c3e9a1f52b4.
+
+    python benchmarks/explain_indexes.py [--venues N] [--artists N] [--shows N]
+
+Runs on a throwaway SQLite database unless BENCH_DATABASE_URL points to a database whose
+tables can be dropped (EXPLAIN ANALYZE plans on Postgres).
+"""
+import argparse
+from common import setup_app, seed, timed
+
+
+def capture(fn):
+    """Runs fn() and returns the (statement, parameters) it executed, as the app sends them."""
+    from sqlalchemy import event
+    from models import db
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def workload():
+    """(name, fn) pairs calling the read paths of the pages with their real queries."""
+    from datetime import datetime, timedelta
+    from models import db, Venue, Genre, Show
+    from queries import (venue_shows, artist_shows, shows_page, artists_page, venue_areas,
+                         show_calendar, upcoming_show_counts)
+    now = datetime.now()
+    return [
+        ('venue page shows', lambda: venue_shows(7)),
+        ('artist page shows', lambda: artist_shows(7)),
+        ('/shows page', lambda: shows_page(limit=50)),
+        ('/shows page 2', lambda: shows_page(after=[(now + timedelta(days=30)).isoformat(), 1], limit=50)),
+        ('/artists page', lambda: artists_page(after=['Artist 5', 6], limit=50)),
+        ('/venues page', lambda: venue_areas(after=['CA', 'City 12', 13], limit=50)),
+        ('genre lookup', lambda: db.session.query(Genre.name, Genre.id).filter(Genre.name.in_(['Jazz', 'Folk'])).all()),
+        ('venue calendar', lambda: show_calendar(Show.venue_id, [3, 4], now, now + timedelta(days=31))),
+        ('upcoming counts', lambda: upcoming_show_counts(Venue, range(1, 51))),
+        ('name search', lambda: db.session.query(Venue.id).filter(Venue.name.ilike('%nue 12%')).all()),
+    ]
+
+
+# the tables migration 7c3e9a1f52b4 indexed, the baseline schema had primary keys only
+INDEXED_TABLES = ('Show', 'Venue', 'Artist', 'Genre', 'venue_genre_relation', 'artist_genre_relation')
+
+
+def set_indexes(create):
+    from models import db
+    for name in INDEXED_TABLES:
+        for index in db.metadata.tables[name].indexes:
+            if create:
+                index.create(db.engine, checkfirst=True)
+            else:
+                index.drop(db.engine, checkfirst=True)
+    db.session.commit()
+
+
+def explain(statement, parameters):
+    from models import db
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        rows = connection.exec_driver_sql('EXPLAIN (ANALYZE, COSTS OFF) ' + statement, parameters).all()
+        return [row[0] for row in rows]
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    return [row[-1] for row in rows]
+
+
+def run_statements(statements):
+    from models import db
+    connection = db.session.connection()
+    for statement, parameters in statements:
+        connection.exec_driver_sql(statement, parameters).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--artists', type=int, default=4000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_app()
+    seed(args.venues, args.artists, args.shows)
+    from models import db
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+    captured = [(name, capture(fn)) for name, fn in workload()]
+
+    results = {}
+    for phase, create in (('without indexes', False), ('with indexes', True)):
+        set_indexes(create)
+        print(f'== {phase}')
+        for name, statements in captured:
+            seconds = timed(lambda: run_statements(statements), args.repeat)
+            results.setdefault(name, []).append(seconds)
+            print(f'-- {name}: {seconds * 1000:.2f} ms')
+            for statement, parameters in statements:
+                for line in explain(statement, parameters):
+                    print(f'   {line}')
+        print()
+
+    print(f'{"query":<20} {"without":>12} {"with":>12} {"speedup":>9}')
+    for name, (without, with_) in results.items():
+        print(f'{name:<20} {without * 1000:>9.2f} ms {with_ * 1000:>9.2f} ms {without / with_:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
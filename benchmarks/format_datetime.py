@@ -0,0 +1,60 @@
+"""Throughput of the `datetime` Jinja filter: the original dateutil + babel.dates.format_datetime
+version against the compiled, memoized one of app.py.
+
+    python benchmarks/format_datetime.py [--values N] [--calls N]
+
+The filter is called over `--values` distinct start times, cycled like the pages repeat
+them (/shows, venue and artist pages): with the default 500 values every one is formatted
+many times, with as many values as calls none repeats and the LRU only costs a lookup.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from common import setup_app
+
+
+def original(value, format='medium'):
+    # the filter before user-012: the views passed strings, parsed and formatted on every call
+    import babel.dates
+    import dateutil.parser
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def throughput(fn, values, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        fn(values[i % len(values)])
+    return calls / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--values', type=int, default=500, help='Distinct start times.')
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_app()
+    from app import format_datetime, format_datetime_cached
+    first = datetime(2026, 1, 1, 20)
+    values = [first + timedelta(hours=7 * i) for i in range(args.values)]
+    strings = [str(value) for value in values]
+    assert all(original(string, format) == format_datetime(value, format)
+               for string, value in zip(strings, values) for format in ('full', 'medium'))
+
+    print(f'{"format":<8} {"original":>14} {"compiled, cold":>16} {"memoized":>14} {"speedup":>8}')
+    for format in ('full', 'medium'):
+        before = throughput(lambda value: original(value, format), strings, args.calls)
+        # the first call of each value: the pattern is compiled, the result not cached yet
+        format_datetime_cached.cache_clear()
+        cold = throughput(lambda value: format_datetime(value, format), values, len(values))
+        after = throughput(lambda value: format_datetime(value, format), values, args.calls)
+        print(f'{format:<8} {before:>8,.0f} ops/s {cold:>10,.0f} ops/s {after:>8,.0f} ops/s {after / before:>7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Load test of the connection pool: request latency percentiles and errors as the number
+of concurrent clients goes past pool_size + max_overflow.
+
+    python benchmarks/pool_load.py [--pool-size N] [--max-overflow N] [--requests N]
+
+The app is served by a threaded WSGI server in this process, every request checks a
+connection out of the pool. Without BENCH_DATABASE_URL it runs on a throwaway SQLite file
+with the QueuePool settings given here, on Postgres with the pool settings of config.py
+(DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT).
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from common import setup_app, seed, percentile
+
+
+def serve(app):
+    from werkzeug.serving import make_server
+    # no access log line per request
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def fetch(url):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+            status = response.status
+    except HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 0
+    return time.perf_counter() - started, status
+
+
+def round_(base, paths, concurrency, requests):
+    """Runs `requests` requests over `paths` from `concurrency` clients, returns
+    (latencies, statuses, highest checked out connections seen by /healthz)."""
+    peak = [0]
+    done = threading.Event()
+
+    def watch():
+        # the pool's checked out connections while the clients run
+        while not done.is_set():
+            with urllib.request.urlopen(base + '/healthz', timeout=60) as response:
+                peak[0] = max(peak[0], json.loads(response.read()).get('checkedout', 0))
+            time.sleep(0.05)
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    with ThreadPoolExecutor(concurrency) as clients:
+        results = list(clients.map(fetch, [base + paths[i % len(paths)] for i in range(requests)]))
+    done.set()
+    watcher.join()
+    return [seconds for seconds, _ in results], [status for _, status in results], peak[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--max-overflow', type=int, default=2)
+    parser.add_argument('--pool-timeout', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=400, help='Requests per round.')
+    parser.add_argument('--concurrency', default='2,4,6,12,24,48', help='Clients of each round.')
+    args = parser.parse_args()
+
+    engine_options = None
+    if not os.environ.get('BENCH_DATABASE_URL'):
+        from sqlalchemy.pool import QueuePool
+        engine_options = {'poolclass': QueuePool, 'pool_size': args.pool_size,
+                          'max_overflow': args.max_overflow, 'pool_timeout': args.pool_timeout,
+                          'connect_args': {'check_same_thread': False}}
+    app = setup_app(engine_options)
+    seed(200, 400, 4000)
+    from models import db
+    db.session.remove()
+    pool = db.engine.pool
+    print(f'{type(pool).__name__} size={pool.size()} overflow={getattr(pool, "_max_overflow", "?")} '
+          f'timeout={getattr(pool, "_timeout", "?")}s')
+
+    server, base = serve(app)
+    paths = ['/shows?limit=20', '/venues?limit=20', '/artists?limit=20', '/venues/7', '/artists/9']
+    print(f'{"clients":>8} {"p50":>9} {"p95":>9} {"p99":>9} {"max":>9} {"errors":>7} {"checked out":>12} {"req/s":>7}')
+    try:
+        for concurrency in [int(n) for n in args.concurrency.split(',')]:
+            started = time.perf_counter()
+            latencies, statuses, peak = round_(base, paths, concurrency, args.requests)
+            elapsed = time.perf_counter() - started
+            errors = sum(1 for status in statuses if status != 200)
+            print(f'{concurrency:>8} ' + ' '.join(f'{percentile(latencies, p) * 1000:>6.1f} ms' for p in (50, 95, 99))
+                  + f' {max(latencies) * 1000:>6.1f} ms {errors:>7} {peak:>12} {len(latencies) / elapsed:>7.0f}')
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
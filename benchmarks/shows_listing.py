@@ -0,0 +1,93 @@
+"""/shows over a large catalog: the ORM listing with lazy-loaded venues and artists it
+replaced against the column-only Core select of queries.show_listing().
+
+    python benchmarks/shows_listing.py [--venues N] [--artists N] [--shows N]
+
+Each variant builds the rows pages/shows.html renders, from a fresh session, and reports
+the median time and the number of statements. The pages are 50 shows, the full listings
+every upcoming show (half of --shows). The last lines time whole requests to the app.
+"""
+import argparse
+import time
+from common import setup_app, seed, timed
+
+
+def orm_rows(shows):
+    # the view before user-021: one lazy load per venue and artist not in the session yet
+    return [{
+        "venue_id": show.venue_id,
+        "venue_name": show.venue.name,
+        "artist_id": show.artist.id,
+        "artist_name": show.artist.name,
+        "artist_image_link": show.artist.image_link,
+        "start_time": show.start_time,
+    } for show in shows]
+
+
+def variants(limit):
+    from datetime import datetime
+    from models import Show
+    from queries import shows_page, iter_shows
+
+    def upcoming():
+        return Show.query.filter(Show.start_time > datetime.now()).order_by(Show.start_time, Show.id)
+    return [
+        ('ORM page, lazy loads', lambda: orm_rows(upcoming().limit(limit).all())),
+        ('Core page', lambda: shows_page(limit=limit)[0]),
+        ('ORM listing, lazy loads', lambda: orm_rows(upcoming().all())),
+        ('Core listing, streamed', lambda: list(iter_shows())),
+    ]
+
+
+def counted(fn):
+    """Runs fn() in a fresh session, returns (rows, statements)."""
+    from sqlalchemy import event
+    from models import db
+    statements = [0]
+
+    def before_cursor_execute(*args):
+        statements[0] += 1
+    db.session.remove()
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        rows = fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        db.session.remove()
+    return len(rows), statements[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--artists', type=int, default=4000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = setup_app()
+    started = time.perf_counter()
+    seed(args.venues, args.artists, args.shows)
+    print(f'seeded {args.shows} shows in {time.perf_counter() - started:.1f} s')
+
+    print(f'{"variant":<26} {"rows":>7} {"statements":>11} {"median":>12}')
+    for name, fn in variants(args.limit):
+        rows, statements = counted(fn)
+        seconds = timed(lambda: counted(fn), args.repeat)
+        print(f'{name:<26} {rows:>7} {statements:>11} {seconds * 1000:>9.1f} ms')
+
+    client = app.test_client()
+    for path in (f'/shows?limit={args.limit}', '/shows?stream=1'):
+        def get():
+            response = client.get(path)
+            # a streamed body is produced while it is read
+            size = len(response.get_data())
+            assert response.status_code == 200
+            return size
+        size = get()
+        print(f'GET {path:<22} {size / 1024:>9.0f} KiB {timed(get, args.repeat) * 1000:>9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
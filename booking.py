@@ -0,0 +1,167 @@
+from bisect import bisect_left, bisect_right
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, text
+from models import db, Show, MAX_SHOW_DURATION, SHOW_OVERLAP_CONSTRAINTS, overlap_constraint_ddl
+from queries import stream_query
+
+# Show bookings: a show occupies its venue and its artist from start_time to end_time, two
+# shows of the same venue or artist can't overlap (back to back is fine).
+#
+# Handlers creating shows call check_bookings() first. No show lasts more than
+# MAX_SHOW_DURATION (the ck_Show_max_duration constraint of models.py), so the shows that may overlap [start, end) are the ones starting in
+# (start - MAX_SHOW_DURATION, end): a bounded range of the (venue_id|artist_id, start_time)
+# indexes, one query per side for a whole batch of bookings. The shows read are kept per
+# venue/artist in a Schedule (sorted by start time, binary searched) to check the bookings
+# against them and against each other. A Schedule is a pair of plain lists: the stored shows
+# are read in start order and appended, only the bookings are inserted in the middle, and
+# there are at most MAX_BOOKINGS of them per check.
+#
+# On Postgres the exclusion constraints of models.py also reject overlaps written
+# concurrently, elsewhere the checks are all there is. `flask conflicts` reports the
+# overlapping shows already stored (e.g. written before the constraints existed).
+
+
+# bookings checked together, the batches of the importer are cut to this size
+MAX_BOOKINGS = 10000
+
+
+class Schedule:
+    """Shows of venues or artists, each (start, end, ref) kept sorted by start per owner."""
+
+    def __init__(self):
+        self._starts = {}
+        self._shows = {}
+
+    def add(self, owner, start, end, ref):
+        starts = self._starts.setdefault(owner, [])
+        shows = self._shows.setdefault(owner, [])
+        if not starts or start >= starts[-1]:
+            starts.append(start)
+            shows.append((start, end, ref))
+            return
+        i = bisect_right(starts, start)
+        starts.insert(i, start)
+        shows.insert(i, (start, end, ref))
+
+    def overlapping(self, owner, start, end):
+        starts = self._starts.get(owner)
+        if not starts:
+            return []
+        # only shows starting less than MAX_SHOW_DURATION before `start` can still be running
+        first = bisect_right(starts, start - MAX_SHOW_DURATION)
+        last = bisect_left(starts, end)
+        return [show for show in self._shows[owner][first:last] if show[1] > start]
+
+
+def _stored_shows(owner_column, owner_ids, start, end):
+    return db.session.query(Show.id, owner_column, Show.start_time, Show.end_time) \
+        .filter(owner_column.in_(owner_ids),
+                Show.start_time > start - MAX_SHOW_DURATION,
+                Show.start_time < end,
+                Show.end_time > start) \
+        .order_by(owner_column, Show.start_time)
+
+
+def check_bookings(bookings):
+    """`bookings`: (venue_id, artist_id, start_time, end_time) tuples. Returns the conflicts of
+    each booking, an empty list when it can be made. A conflict is a dict: `on` ('venue' or
+    'artist'), `start_time`, `end_time` and `show_id` (a stored show) or `booking` (the index
+    of an earlier booking of the list, only bookings without conflicts count). At most
+    MAX_BOOKINGS bookings."""
+    if not bookings:
+        return []
+    if len(bookings) > MAX_BOOKINGS:
+        raise ValueError(f'At most {MAX_BOOKINGS} bookings are checked together')
+    start = min(booking[2] for booking in bookings)
+    end = max(booking[3] for booking in bookings)
+    schedules = {}
+    for on, column, position in (('venue', Show.venue_id, 0), ('artist', Show.artist_id, 1)):
+        schedule = schedules[on] = Schedule()
+        for show_id, owner, show_start, show_end in _stored_shows(
+                column, {booking[position] for booking in bookings}, start, end):
+            schedule.add(owner, show_start, show_end, ('show_id', show_id))
+
+    results = []
+    for i, (venue_id, artist_id, start_time, end_time) in enumerate(bookings):
+        conflicts = []
+        for on, owner in (('venue', venue_id), ('artist', artist_id)):
+            for show_start, show_end, (key, ref) in schedules[on].overlapping(owner, start_time, end_time):
+                conflicts.append({'on': on, key: ref, 'start_time': show_start, 'end_time': show_end})
+        if not conflicts:
+            schedules['venue'].add(venue_id, start_time, end_time, ('booking', i))
+            schedules['artist'].add(artist_id, start_time, end_time, ('booking', i))
+        results.append(conflicts)
+    return results
+
+
+def describe_conflict(conflict, numbers=None, unit='row'):
+    """Message for a conflict of check_bookings(), `numbers`: the numbers the bookings are
+    reported under (1, 2, ... by default), `unit`: what they number ('row', 'line')."""
+    if 'show_id' in conflict:
+        what = f'show {conflict["show_id"]}'
+    else:
+        number = numbers[conflict['booking']] if numbers is not None else conflict['booking'] + 1
+        what = f'the show of {unit} {number}'
+    return f'the {conflict["on"]} already has {what} from {conflict["start_time"]:%Y-%m-%d %H:%M} ' \
+           f'to {conflict["end_time"]:%Y-%m-%d %H:%M}'
+
+
+def _sweep(owner_column):
+    # shows ordered by (owner, start_time): each show overlaps the shows of its owner still
+    # running when it starts, `running` only holds those
+    statement = select(owner_column, Show.id, Show.start_time, Show.end_time) \
+        .order_by(owner_column, Show.start_time, Show.id)
+    owner = None
+    running = []
+    for row_owner, show_id, start, end in stream_query(statement):
+        if row_owner != owner:
+            owner, running = row_owner, []
+        running = [show for show in running if show[2] > start]
+        for other_id, other_start, other_end in running:
+            yield owner, other_id, show_id, start, min(end, other_end)
+        running.append((show_id, start, end))
+
+
+def find_all_conflicts():
+    """Yields every pair of overlapping stored shows as (on, owner id, show id, other show id,
+    overlap start, overlap end), one pass over each of the show indexes."""
+    for on, column in (('venue', Show.venue_id), ('artist', Show.artist_id)):
+        for conflict in _sweep(column):
+            yield (on, *conflict)
+
+
+def add_overlap_constraints():
+    """Creates the exclusion constraints of models.py missing on Postgres, returns their names.
+    Fails if stored shows overlap."""
+    if db.engine.dialect.name != 'postgresql':
+        return []
+    existing = {name for name, in db.session.execute(
+        text('SELECT conname FROM pg_constraint WHERE conrelid = \'"Show"\'::regclass'))}
+    db.session.execute(text('CREATE EXTENSION IF NOT EXISTS btree_gist'))
+    added = []
+    for name, column in SHOW_OVERLAP_CONSTRAINTS:
+        if name not in existing:
+            db.session.execute(text(overlap_constraint_ddl(name, column)))
+            added.append(name)
+    db.session.commit()
+    return added
+
+
+@click.command('conflicts')
+@click.option('--constrain', is_flag=True,
+              help='Add the Postgres overlap constraints afterwards if no shows overlap.')
+@with_appcontext
+def conflicts_command(constrain):
+    """Report the shows of a venue or artist that overlap."""
+    found = 0
+    for on, owner, show_id, other_id, start, end in find_all_conflicts():
+        found += 1
+        click.echo(f'{on} {owner}: shows {show_id} and {other_id} overlap '
+                   f'from {start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M}')
+    click.echo(f'{found} overlapping pairs of shows')
+    if constrain:
+        if found:
+            raise click.ClickException('Not adding the constraints, resolve the overlaps first')
+        added = add_overlap_constraints()
+        click.echo(f'Added constraints: {", ".join(added)}' if added else 'No constraints to add')
@@ -0,0 +1,211 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, request, session, Response
+
+# Rendered page cache for the read-heavy GET pages (/venues, /artists, /shows and the
+# venue/artist detail pages).
+#
+# Entries are keyed by endpoint, view arguments and query string and carry tags naming
+# the records they were built from ('venues', 'venue:3', 'artist:7', 'area:CA|San Francisco'...).
+# The create/edit/delete handlers call invalidate() with the tags of what they changed.
+# TTL bounds staleness for what no handler changes, e.g. shows moving from upcoming to past
+# as time passes, or writes handled by another process when the cache is in-process.
+#
+# CACHE_BACKEND in config.py: 'memory' (per process LRU), 'redis' (shared, needs the redis
+# package and CACHE_REDIS_URL) or 'none'.
+
+
+class CacheBackend:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl, tags=()):
+        raise NotImplementedError
+
+    def invalidate(self, tags):
+        raise NotImplementedError
+
+    def stats(self):
+        return {"backend": type(self).__name__, "hits": self.hits, "misses": self.misses}
+
+
+class NullCache(CacheBackend):
+    def get(self, key):
+        self.misses += 1
+        return None
+
+    def set(self, key, value, ttl, tags=()):
+        pass
+
+    def invalidate(self, tags):
+        pass
+
+
+class LRUCache(CacheBackend):
+    def __init__(self, max_entries=1000):
+        super().__init__()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (expires_at, value, tags), least recently used first
+        self._entries = OrderedDict()
+        # tag -> set of keys
+        self._tags = {}
+
+    def _drop(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl, tags=()):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            tags = frozenset(tags)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+
+    def stats(self):
+        stats = super().stats()
+        stats["entries"] = len(self._entries)
+        return stats
+
+
+class RedisCache(CacheBackend):
+    def __init__(self, url, prefix='fyyur:cache:'):
+        super().__init__()
+        # optional dependency, only needed for this backend
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self._redis.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value.decode()
+
+    def set(self, key, value, ttl, tags=()):
+        pipe = self._redis.pipeline()
+        pipe.set(self.prefix + key, value, ex=ttl)
+        for tag in tags:
+            # tag sets outlive their entries by at most one ttl, keys that expired are just deleted again
+            pipe.sadd(self.prefix + 'tag:' + tag, key)
+            pipe.expire(self.prefix + 'tag:' + tag, ttl)
+        pipe.execute()
+
+    def invalidate(self, tags):
+        for tag in tags:
+            tag_key = self.prefix + 'tag:' + tag
+            keys = self._redis.smembers(tag_key)
+            pipe = self._redis.pipeline()
+            if keys:
+                pipe.delete(*[self.prefix + key.decode() for key in keys])
+            pipe.delete(tag_key)
+            pipe.execute()
+
+
+def get_cache():
+    cache = current_app.extensions.get('cache')
+    if cache is None:
+        backend = current_app.config.get('CACHE_BACKEND', 'memory')
+        if backend == 'redis':
+            cache = RedisCache(current_app.config['CACHE_REDIS_URL'])
+        elif backend == 'memory':
+            cache = LRUCache(current_app.config.get('CACHE_MAX_ENTRIES', 1000))
+        else:
+            cache = NullCache()
+        current_app.extensions['cache'] = cache
+    return cache
+
+
+def add_cache_tags(*tags):
+    """Adds tags to the page being rendered by a cached_page() view, for records
+    only known once the view has read its data."""
+    g.setdefault('cache_tags', set()).update(tags)
+
+
+def invalidate(*tags):
+    try:
+        get_cache().invalidate(tags)
+    except Exception as e:
+        # a cache outage must not fail the write that triggered it, the ttl bounds staleness
+        current_app.logger.error(f'Cache invalidation of {tags} failed: {e}')
+
+
+def area_tag(city, state):
+    return f'area:{state}|{city}'
+
+
+def cached_page(*tags):
+    """Caches the HTML a view renders.
+
+    `tags` are strings or callables taking the view arguments and returning a tag.
+    Under conditional_page() the page's ETag is part of the key, so the cached HTML always
+    matches the ETag it is sent with.
+    Only rendered pages (str) are cached, redirects and other responses pass through,
+    as do requests with pending flash messages since those are rendered into the page.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(**view_args)
+            cache = get_cache()
+            key = '{}:{}:{}'.format(request.endpoint,
+                                    ','.join(f'{k}={v}' for k, v in sorted(view_args.items())),
+                                    '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True))))
+            version = g.get('page_version')
+            if version is not None:
+                key = f'{key}:{version}'
+            try:
+                page = cache.get(key)
+            except Exception as e:
+                current_app.logger.error(f'Cache read of {key} failed: {e}')
+                return view(**view_args)
+            if page is not None:
+                return Response(page, mimetype='text/html')
+
+            g.cache_tags = set()
+            rv = view(**view_args)
+            if isinstance(rv, str):
+                page_tags = {tag(view_args) if callable(tag) else tag for tag in tags} | g.cache_tags
+                try:
+                    cache.set(key, rv, current_app.config.get('CACHE_DEFAULT_TTL', 60), page_tags)
+                except Exception as e:
+                    current_app.logger.error(f'Cache write of {key} failed: {e}')
+            return rv
+        return wrapper
+    return decorator
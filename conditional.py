@@ -0,0 +1,49 @@
+import hashlib
+from functools import wraps
+from flask import g, request, session, make_response, Response
+
+# HTTP validators for the catalog pages.
+#
+# conditional_page(version) reads the version of the page (see the *_version() functions
+# in queries.py, counters kept by versions.py) before the view runs, derives an ETag from it and answers
+# `304 Not Modified` when the client already has that version, without querying the page
+# data or rendering the template. Pages carry `Cache-Control: no-cache` so browsers and the
+# CDN revalidate on every use.
+#
+# There is no Last-Modified: the newest updated_at of a page doesn't change when rows are
+# deleted or shows move from upcoming to past, its version counter does. Clients
+# revalidating with If-Modified-Since only always get the page.
+#
+# The ETag is also part of the cached_page() key (g.page_version): a page cached before a
+# write is never sent under the ETag of the version after it, invalidated or not.
+
+
+def _etag(values):
+    # the query string is part of the page (pagination), so part of the ETag
+    return hashlib.sha1(repr((request.full_path, values)).encode()).hexdigest()
+
+
+def _set_validators(response, etag):
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional_page(version):
+    """`version(**view_args)` returns a tuple of values that change whenever the page would."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            # pending flash messages are rendered into the page, always send it
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(**view_args)
+            etag = _etag(version(**view_args))
+            if request.if_none_match.contains(etag):
+                return _set_validators(Response(status=304), etag)
+            g.page_version = etag
+            response = make_response(view(**view_args))
+            if response.status_code == 200:
+                _set_validators(response, etag)
+            return response
+        return wrapper
+    return decorator
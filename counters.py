@@ -0,0 +1,144 @@
+from collections import Counter
+from datetime import datetime
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, case, func, true, false
+from models import db, Venue, Artist, Show
+from cache import invalidate
+from versions import bump_versions
+
+# Upcoming/past show counters of venues and artists.
+#
+# Venue and Artist carry upcoming_shows_count and past_shows_count so the pages and the API
+# read them instead of counting shows. A show is counted as past when Show.is_past is set:
+# at creation for shows that already started, later by `flask counters rollover` (run
+# periodically, e.g. from cron) for the shows whose start time has passed since.
+#
+# The handlers creating shows call shows_added() in the same transaction, the counters are
+# changed with `SET count = count + n` so concurrent writes don't lose updates. Shows are
+# never deleted (a venue with shows can't be), so nothing is ever uncounted.
+# `flask counters check` recomputes them and reports (or --fix-es) drift. Both change the
+# venue and artist pages, so they bump their versions (versions.py).
+
+
+def _apply(model, deltas):
+    # deltas: {id: (upcoming delta, past delta)}, one executemany for all rows
+    if not deltas:
+        return
+    table = model.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.id == bindparam('_id'))
+        .values(upcoming_shows_count=table.c.upcoming_shows_count + bindparam('_upcoming'),
+                past_shows_count=table.c.past_shows_count + bindparam('_past')),
+        [{'_id': id, '_upcoming': upcoming, '_past': past} for id, (upcoming, past) in deltas.items()]
+    )
+
+
+def _deltas(shows):
+    venues, artists = Counter(), Counter()
+    for venue_id, artist_id, is_past in shows:
+        venues[int(venue_id), bool(is_past)] += 1
+        artists[int(artist_id), bool(is_past)] += 1
+
+    def by_id(counts):
+        deltas = {}
+        for (id, is_past), n in counts.items():
+            upcoming, past = deltas.get(id, (0, 0))
+            deltas[id] = (upcoming, past + n) if is_past else (upcoming + n, past)
+        return deltas
+    return by_id(venues), by_id(artists)
+
+
+def shows_added(shows):
+    """Counts new shows, given as (venue_id, artist_id, is_past) tuples."""
+    venues, artists = _deltas(shows)
+    _apply(Venue, venues)
+    _apply(Artist, artists)
+
+
+def rollover(now=None, batch_size=1000):
+    """Moves the shows that started before `now` from upcoming to past, committing every
+    `batch_size` shows. Returns the number of shows moved."""
+    if now is None:
+        now = datetime.now()
+    moved = 0
+    while True:
+        # rows locked by a concurrent run are left to it (Postgres, ignored by SQLite)
+        rows = db.session.query(Show.id, Show.venue_id, Show.artist_id) \
+            .filter(Show.is_past == false(), Show.start_time <= now) \
+            .order_by(Show.start_time) \
+            .limit(batch_size) \
+            .with_for_update(skip_locked=True) \
+            .all()
+        if not rows:
+            return moved
+        db.session.execute(Show.__table__.update()
+                           .where(Show.id.in_([row.id for row in rows]))
+                           .values(is_past=True))
+        # each show: one upcoming less, one past more
+        for model, ids in ((Venue, Counter(row.venue_id for row in rows)),
+                           (Artist, Counter(row.artist_id for row in rows))):
+            _apply(model, {id: (-n, n) for id, n in ids.items()})
+        # the shows leave /shows and move to the past shows of their venue and artist pages
+        tags = {f'venue:{row.venue_id}' for row in rows} | {f'artist:{row.artist_id}' for row in rows}
+        bump_versions('shows', *tags)
+        db.session.commit()
+        invalidate(*tags)
+        moved += len(rows)
+
+
+def _drift(model, owner_column):
+    # counters that differ from a recount of the shows, computed in one grouped query
+    upcoming = func.count(case((Show.is_past == false(), Show.id)))
+    past = func.count(case((Show.is_past == true(), Show.id)))
+    return db.session.query(model.id, model.upcoming_shows_count, upcoming, model.past_shows_count, past) \
+        .outerjoin(Show, owner_column == model.id) \
+        .group_by(model.id) \
+        .having((model.upcoming_shows_count != upcoming) | (model.past_shows_count != past)) \
+        .order_by(model.id) \
+        .all()
+
+
+def check(fix=False):
+    """Returns {'venues': [...], 'artists': [...]} rows of (id, upcoming_shows_count,
+    actual upcoming, past_shows_count, actual past) for the counters that drifted,
+    resetting them to the actual counts when `fix` is set."""
+    drift = {
+        'venues': _drift(Venue, Show.venue_id),
+        'artists': _drift(Artist, Show.artist_id),
+    }
+    if fix:
+        for model, rows in ((Venue, drift['venues']), (Artist, drift['artists'])):
+            # as deltas, so shows written since the recount are not lost
+            _apply(model, {id: (upcoming - stored_upcoming, past - stored_past)
+                           for id, stored_upcoming, upcoming, stored_past, past in rows})
+        bump_versions(*(f'venue:{row[0]}' for row in drift['venues']), *(f'artist:{row[0]}' for row in drift['artists']))
+        db.session.commit()
+    return drift
+
+
+counters_cli = AppGroup('counters', help='Maintain the show counters of venues and artists.')
+
+
+@counters_cli.command('rollover')
+@click.option('--batch-size', default=1000, show_default=True, help='Shows moved per transaction.')
+def rollover_command(batch_size):
+    """Count the shows that have started as past shows, run it periodically."""
+    click.echo(f'Moved {rollover(batch_size=batch_size)} shows from upcoming to past')
+
+
+@counters_cli.command('check')
+@click.option('--fix', is_flag=True, help='Reset the drifted counters to the actual counts.')
+def check_command(fix):
+    """Recount the shows of every venue and artist and report the counters that differ."""
+    drift = check(fix=fix)
+    for kind, rows in drift.items():
+        for id, stored_upcoming, upcoming, stored_past, past in rows:
+            click.echo(f'{kind} {id}: upcoming {stored_upcoming} (actual {upcoming}), '
+                       f'past {stored_past} (actual {past})')
+    total = sum(len(rows) for rows in drift.values())
+    pending = db.session.query(func.count(Show.id)) \
+        .filter(Show.is_past == false(), Show.start_time <= datetime.now()).scalar()
+    click.echo(f'{total} drifted counters{" fixed" if fix and total else ""}, '
+               f'{pending} started shows waiting for the rollover')
@@ -0,0 +1,138 @@
+import csv
+import io
+import zlib
+from datetime import date, datetime
+import click
+from flask.cli import with_appcontext
+from models import db, Venue, Artist, Show, Genre, artist_genre_relation, venue_genre_relation
+from queries import stream_query
+from serializers import dumps
+
+# Catalog export for `flask export` and /api/v1/export.
+#
+# Rows are read through a server-side cursor (stream_query) and encoded as they arrive,
+# in chunks of CHUNK_ROWS rows, so memory stays constant whatever the size of the catalog.
+# Output is CSV (header row with the column names) or JSON lines, optionally gzipped on
+# the fly.
+#
+# Filters: `state` (of the venue/artist, of the venue for shows), `start_from`/`start_to`
+# (show start times) and `updated_since` (venues, artists and shows changed since then,
+# for incremental loads).
+
+CHUNK_ROWS = 500
+
+EXPORTS = ('venues', 'artists', 'shows', 'venue_genres', 'artist_genres')
+FORMATS = ('csv', 'jsonl')
+
+
+def _columns(model):
+    return list(model.__table__.c)
+
+
+def _genre_query(relation, owner_column, model):
+    return db.session.query(owner_column, relation.c.genre_id, Genre.name.label('genre')) \
+        .join(Genre, Genre.id == relation.c.genre_id) \
+        .join(model, model.id == owner_column) \
+        .order_by(owner_column, relation.c.genre_id)
+
+
+def export_query(kind, state=None, start_from=None, start_to=None, updated_since=None):
+    """Returns the query exporting `kind` (a key of EXPORTS) with the filters applied."""
+    # owner: the table `state` applies to, updated: the table `updated_since` applies to
+    if kind == 'venues':
+        query = db.session.query(*_columns(Venue)).order_by(Venue.id)
+        owner = updated = Venue
+    elif kind == 'artists':
+        query = db.session.query(*_columns(Artist)).order_by(Artist.id)
+        owner = updated = Artist
+    elif kind == 'shows':
+        query = db.session.query(*_columns(Show)).join(Venue, Venue.id == Show.venue_id).order_by(Show.id)
+        owner, updated = Venue, Show
+        if start_from is not None:
+            query = query.filter(Show.start_time >= start_from)
+        if start_to is not None:
+            query = query.filter(Show.start_time < start_to)
+    elif kind == 'venue_genres':
+        query = _genre_query(venue_genre_relation, venue_genre_relation.c.venue_id, Venue)
+        owner = updated = Venue
+    elif kind == 'artist_genres':
+        query = _genre_query(artist_genre_relation, artist_genre_relation.c.artist_id, Artist)
+        owner = updated = Artist
+    else:
+        raise ValueError(f'Unknown export: {kind}')
+    if state is not None:
+        query = query.filter(owner.state == state)
+    if updated_since is not None:
+        query = query.filter(updated.updated_at >= updated_since)
+    return query
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for i, row in enumerate(rows, start=1):
+        writer.writerow([_csv_value(value) for value in row])
+        if i % CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _jsonl_chunks(columns, rows):
+    lines = []
+    for row in rows:
+        line = dumps(dict(zip(columns, row)))
+        lines.append(line if isinstance(line, bytes) else line.encode())
+        if len(lines) == CHUNK_ROWS:
+            yield b'\n'.join(lines) + b'\n'
+            lines = []
+    if lines:
+        yield b'\n'.join(lines) + b'\n'
+
+
+def gzip_chunks(chunks, level=6):
+    # gzip container (wbits=31), compressed data is handed out as soon as zlib produces it
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(kind, format='csv', gzip=False, **filters):
+    """Yields the export of `kind` as encoded byte chunks."""
+    if format not in FORMATS:
+        raise ValueError(f'Unknown format: {format}')
+    query = export_query(kind, **filters)
+    # table columns are named by quoted_name, a str subclass orjson rejects as a key
+    columns = [str(description['name']) for description in query.column_descriptions]
+    rows = stream_query(query)
+    chunks = _csv_chunks(columns, rows) if format == 'csv' else _jsonl_chunks(columns, rows)
+    return gzip_chunks(chunks) if gzip else chunks
+
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(EXPORTS))
+@click.option('--format', 'format', type=click.Choice(FORMATS), default='csv', show_default=True)
+@click.option('--state', help='Only venues/artists of this state, shows at venues of this state.')
+@click.option('--from', 'start_from', type=click.DateTime(), help='Only shows starting at or after this time.')
+@click.option('--to', 'start_to', type=click.DateTime(), help='Only shows starting before this time.')
+@click.option('--updated-since', type=click.DateTime(), help='Only rows changed since this time.')
+@click.option('--gzip', is_flag=True, help='Gzip the output.')
+@click.option('-o', '--output', type=click.File('wb'), default='-', help='Output file, stdout by default.')
+@with_appcontext
+def export_command(kind, format, state, start_from, start_to, updated_since, gzip, output):
+    """Export venues, artists, shows or genre relations as CSV or JSON lines."""
+    for chunk in export_chunks(kind, format=format, gzip=gzip, state=state, start_from=start_from,
+                               start_to=start_to, updated_since=updated_since):
+        output.write(chunk)
+    output.flush()
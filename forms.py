@@ -1,7 +1,7 @@
 from datetime import datetime
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, Optional
+from wtforms import TextAreaField, StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, Optional, NumberRange
 
 class ShowForm(FlaskForm):
     artist_id = StringField(
@@ -15,6 +15,18 @@ class ShowForm(FlaskForm):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    # minutes, a show can't last more than a day (see booking.py)
+    duration = IntegerField(
+        'duration',
+        validators=[Optional(), NumberRange(min=1, max=24 * 60)],
+        default=120
+    )
+
+class BulkShowForm(FlaskForm):
+    # one show per line: artist_id,venue_id,start_time[,duration]
+    shows = TextAreaField(
+        'shows', validators=[DataRequired()]
+    )
 
 class VenueForm(FlaskForm):
     name = StringField(
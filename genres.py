@@ -0,0 +1,59 @@
+import threading
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import make_transient_to_detached
+from models import db, Genre
+
+# Genre lookups for the venue/artist create and edit handlers.
+#
+# Genres are only ever added, never renamed or deleted, so a name -> id map can be cached
+# for the life of the app, in its extensions: apps on different databases in one process
+# (tests) each have their own. A whole genre list is resolved with one `WHERE name IN (...)`
+# for the names not cached yet and one bulk insert for the ones that don't exist.
+#
+# Inserted genres are deliberately not cached: the insert may still roll back with the
+# caller's transaction, so nothing ever has to be dropped from the cache. Once committed,
+# the next lookup of a name reads it from the database and caches it.
+
+_lock = threading.Lock()
+
+
+def _cache():
+    return current_app.extensions.setdefault('genre_ids', {})
+
+
+def _insert_statement(dialect_name):
+    # Genre.name is unique, let concurrent submissions inserting the same genre both succeed
+    if dialect_name == 'postgresql':
+        return postgresql.insert(Genre).on_conflict_do_nothing(index_elements=['name'])
+    if dialect_name == 'sqlite':
+        return sqlite.insert(Genre).on_conflict_do_nothing(index_elements=['name'])
+    return Genre.__table__.insert()
+
+
+def _genre(id, name):
+    # attach a Genre with a known id to the session without loading it
+    genre = Genre(id=id, name=name)
+    make_transient_to_detached(genre)
+    return db.session.merge(genre, load=False)
+
+
+def resolve_genres(names):
+    """Returns the Genre objects for `names`, in order and without duplicates, creating
+    the genres that don't exist yet in the current transaction."""
+    names = list(dict.fromkeys(name for name in names if name))
+    cache = _cache()
+    found = {name: cache[name] for name in names if name in cache}
+    missing = [name for name in names if name not in found]
+    if missing:
+        rows = db.session.query(Genre.name, Genre.id).filter(Genre.name.in_(missing)).all()
+        with _lock:
+            cache.update(rows)
+        found.update(rows)
+        missing = [name for name in missing if name not in found]
+    if missing:
+        insert = _insert_statement(db.engine.dialect.name)
+        db.session.execute(insert, [{'name': name} for name in missing])
+        # not cached: the insert is only visible once the caller commits, and it may roll back
+        found.update(db.session.query(Genre.name, Genre.id).filter(Genre.name.in_(missing)).all())
+    return [_genre(found[name], name) for name in names]
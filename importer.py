@@ -0,0 +1,316 @@
+import csv
+import json
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+import click
+from flask.cli import with_appcontext
+from werkzeug.datastructures import MultiDict
+from forms import VenueForm, ArtistForm, ShowForm
+from sqlalchemy import tuple_
+from models import db, Venue, Artist, Show
+from genres import resolve_genres
+from cache import invalidate
+from summary import refresh_venues
+from versions import bump_versions
+from counters import shows_added
+from booking import check_bookings, describe_conflict, MAX_BOOKINGS
+
+# `flask import <venues|artists|shows> <file>`: bulk load of promoter feeds.
+#
+# Files are CSV (header row with the form field names) or JSON lines, read as a stream.
+# Every row is validated with the same form as the web handlers, rows that fail are
+# reported and skipped. Valid rows are written in batches: venues and artists through
+# the ORM (one batched INSERT per table per batch, genres resolved once per batch),
+# shows with a Core executemany. A commit happens every --transaction-size rows.
+#
+# /shows/bulk goes through bulk_create_shows(): the same show pipeline for one upload, in a
+# single transaction, with a result per row.
+#
+# Files written by `flask export` import as they are: booleans as True/False, shows with
+# ISO 8601 times and an end_time instead of a duration. Genres are exported apart
+# (venue_genres, artist_genres) and have to be added as a `genres` column.
+
+IMPORTS = {
+    'venues': (Venue, VenueForm),
+    'artists': (Artist, ArtistForm),
+    'shows': (Show, ShowForm),
+}
+
+BOOLEAN_FIELDS = {'seeking_talent', 'seeking_venue'}
+
+
+def read_rows(stream, format):
+    """Yields (line number, field dict) from a CSV or JSON lines stream."""
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # multi-valued fields (genres) are comma separated in a single CSV cell
+            if 'genres' in row:
+                row['genres'] = [genre.strip() for genre in (row['genres'] or '').split(',') if genre.strip()]
+            yield reader.line_num, row
+    else:
+        for line_num, line in enumerate(stream, start=1):
+            if line.strip():
+                yield line_num, json.loads(line)
+
+
+def _formdata(row):
+    formdata = MultiDict()
+    for key, value in row.items():
+        if isinstance(value, list):
+            for item in value:
+                formdata.add(key, item)
+        elif isinstance(value, bool):
+            # BooleanField treats any non-empty value other than 'false' as checked
+            formdata.add(key, 'y' if value else '')
+        elif key in BOOLEAN_FIELDS and isinstance(value, str):
+            # CSV cells: 'False' as written by the export
+            formdata.add(key, '' if value.strip().lower() in ('', 'false', '0', 'no') else 'y')
+        elif value is not None:
+            formdata.add(key, str(value))
+    return formdata
+
+
+def _exported_show(row):
+    # the form reads start_time to the second and a duration in minutes
+    try:
+        start = datetime.fromisoformat(row['start_time'])
+    except (KeyError, TypeError, ValueError):
+        return row
+    row = dict(row, start_time=f'{start:%Y-%m-%d %H:%M:%S}')
+    if row.get('end_time') and not row.get('duration'):
+        try:
+            row['duration'] = round((datetime.fromisoformat(row['end_time']) - start).total_seconds() / 60)
+        except (TypeError, ValueError):
+            row['duration'] = row['end_time']
+    return row
+
+
+def validate(form_class, row):
+    """Returns (form, errors) for a row, using the form the web handler validates with."""
+    form = form_class(formdata=_formdata(row), meta={'csrf': False})
+    if form.validate():
+        return form, None
+    return form, form.errors
+
+
+def _strip(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+def _venue(form):
+    return {
+        'name': _strip(form.name.data),
+        'city': _strip(form.city.data),
+        'state': form.state.data,
+        'address': _strip(form.address.data),
+        # same normalisation as create_venue_submission
+        'phone': re.sub(r'\D', '', form.phone.data or ''),
+        'seeking_talent': form.seeking_talent.data,
+        'seeking_description': _strip(form.seeking_description.data),
+        'image_link': _strip(form.image_link.data),
+        'website': _strip(form.website.data),
+        'facebook_link': _strip(form.facebook_link.data),
+    }
+
+
+def _artist(form):
+    return {
+        'name': _strip(form.name.data),
+        'city': _strip(form.city.data),
+        'state': form.state.data,
+        # same normalisation as create_artist_submission
+        'phone': re.sub(r'\D', '', form.phone.data or ''),
+        'seeking_venue': form.seeking_venue.data,
+        'seeking_description': _strip(form.seeking_description.data),
+        'image_link': _strip(form.image_link.data),
+        'website_link': _strip(form.website_link.data),
+        'facebook_link': _strip(form.facebook_link.data),
+    }
+
+
+def _show(form):
+    try:
+        return {
+            'artist_id': int(form.artist_id.data),
+            'venue_id': int(form.venue_id.data),
+            'start_time': form.start_time.data,
+            'end_time': form.start_time.data + timedelta(minutes=form.duration.data or form.duration.default),
+        }
+    except (TypeError, ValueError):
+        return None
+
+
+def _write_with_genres(model, batch):
+    # batch: [(line number, column dict, genre names)]
+    genres = {genre.name: genre for genre in resolve_genres(
+        [name for _, _, names in batch for name in names])}
+    objects = []
+    for _, values, names in batch:
+        obj = model(**values)
+        obj.genres = [genres[name] for name in dict.fromkeys(names)]
+        objects.append(obj)
+    db.session.add_all(objects)
+    db.session.flush()
+    if model is Venue:
+        # bumps the version of /venues
+        refresh_venues([venue.id for venue in objects])
+    else:
+        bump_versions('artists')
+    return [], [(line_num, values) for line_num, values, _ in batch]
+
+
+def _write_shows(batch, unit):
+    # batch: [(line number, column dict, None)], ids are checked with one IN query per side,
+    # `unit`: what the numbers count in the conflict messages
+    artist_ids = {values['artist_id'] for _, values, _ in batch}
+    venue_ids = {values['venue_id'] for _, values, _ in batch}
+    known_artists = {id for id, in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))}
+    known_venues = {id for id, in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+    rejected = []
+    candidates = []
+    for line_num, values, _ in batch:
+        if values['artist_id'] not in known_artists:
+            rejected.append((line_num, {'artist_id': ['Unknown artist']}))
+        elif values['venue_id'] not in known_venues:
+            rejected.append((line_num, {'venue_id': ['Unknown venue']}))
+        else:
+            candidates.append((line_num, values))
+    # overlaps with stored shows and with earlier rows of the batch, one query per side
+    conflicts = check_bookings([(values['venue_id'], values['artist_id'], values['start_time'], values['end_time'])
+                                for _, values in candidates])
+    numbers = [line_num for line_num, _ in candidates]
+    written = []
+    now = datetime.now()
+    for (line_num, values), found in zip(candidates, conflicts):
+        if found:
+            rejected.append((line_num, {'start_time': [describe_conflict(conflict, numbers, unit) for conflict in found]}))
+        else:
+            written.append((line_num, dict(values, is_past=values['start_time'] <= now)))
+    if written:
+        rows = [values for _, values in written]
+        db.session.execute(Show.__table__.insert(), rows)
+        shows_added((values['venue_id'], values['artist_id'], values['is_past']) for values in rows)
+        refresh_venues({values['venue_id'] for values in rows})
+        bump_versions('shows', *{f'venue:{values["venue_id"]}' for values in rows},
+                      *{f'artist:{values["artist_id"]}' for values in rows})
+    return rejected, written
+
+
+def import_rows(kind, rows, batch_size=1000, transaction_size=10000, on_reject=None, on_import=None, unit='line'):
+    """Validates and writes `rows` ((line number, field dict) pairs), returns (imported, rejected).
+    `on_reject(line number, errors)` and `on_import(line number, column dict)` are called for each row.
+    `unit` is what the numbers are called in error messages ('line' of a file, 'row')."""
+    model, form_class = IMPORTS[kind]
+    to_columns = {'venues': _venue, 'artists': _artist, 'shows': _show}[kind]
+    if kind == 'shows':
+        # a batch of shows is checked for overlaps at once
+        batch_size = min(batch_size, MAX_BOOKINGS)
+    imported = rejected = uncommitted = 0
+
+    def reject(line_num, errors):
+        nonlocal rejected
+        rejected += 1
+        if on_reject is not None:
+            on_reject(line_num, errors)
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        batch = []
+        for line_num, row in chunk:
+            if kind == 'shows':
+                row = _exported_show(row)
+            form, errors = validate(form_class, row)
+            values = to_columns(form) if errors is None else None
+            if values is None:
+                reject(line_num, errors or {'artist_id': ['artist_id and venue_id must be numbers']})
+            else:
+                batch.append((line_num, values, form.genres.data if kind != 'shows' else None))
+        if batch:
+            if kind == 'shows':
+                batch_rejected, written = _write_shows(batch, unit)
+            else:
+                batch_rejected, written = _write_with_genres(model, batch)
+            for line_num, errors in batch_rejected:
+                reject(line_num, errors)
+            if on_import is not None:
+                for line_num, values in written:
+                    on_import(line_num, values)
+            imported += len(written)
+            uncommitted += len(written)
+        if uncommitted >= transaction_size:
+            db.session.commit()
+            # objects of committed batches are not needed any more
+            db.session.expunge_all()
+            uncommitted = 0
+    db.session.commit()
+    return imported, rejected
+
+
+def bulk_create_shows(rows):
+    """Creates the shows of `rows` (field dicts, as posted to the show form) in one transaction.
+    Returns a result per row: {'row': n, 'id': show id} or {'row': n, 'errors': {...}}."""
+    results = {}
+    created = {}
+
+    def on_reject(row_num, errors):
+        results[row_num] = {'row': row_num, 'errors': errors}
+
+    def on_import(row_num, values):
+        results[row_num] = {'row': row_num, 'id': None}
+        created[values['venue_id'], values['start_time']] = row_num
+
+    rows = list(enumerate(rows, start=1))
+    import_rows('shows', rows, batch_size=max(len(rows), 1), transaction_size=max(len(rows), 1),
+                on_reject=on_reject, on_import=on_import, unit='row')
+    if created:
+        # the shows of a venue don't overlap, so (venue_id, start_time) finds each one
+        for id, venue_id, start_time in db.session.query(Show.id, Show.venue_id, Show.start_time) \
+                .filter(tuple_(Show.venue_id, Show.start_time).in_(list(created))):
+            row_num = created.get((venue_id, start_time))
+            if row_num is not None:
+                results[row_num]['id'] = id
+    return [results[row_num] for row_num, _ in rows]
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'format', type=click.Choice(['csv', 'jsonl']),
+              help='File format, guessed from the extension by default.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows written per batch.')
+@click.option('--transaction-size', default=10000, show_default=True, help='Rows written per commit.')
+@click.option('--rejects', type=click.File('w'), help='Write rejected rows (line number and errors) to this file.')
+@with_appcontext
+def import_command(kind, path, format, batch_size, transaction_size, rejects):
+    """Bulk import venues, artists or shows from a CSV or JSON lines file."""
+    if format is None:
+        format = 'csv' if path.endswith('.csv') else 'jsonl'
+    shown = 0
+
+    def on_reject(line_num, errors):
+        nonlocal shown
+        if rejects is not None:
+            rejects.write(json.dumps({'line': line_num, 'errors': errors}) + '\n')
+        elif shown < 20:
+            click.echo(f'line {line_num}: {errors}', err=True)
+            shown += 1
+
+    started = time.monotonic()
+    stream = sys.stdin if path == '-' else open(path, newline='' if format == 'csv' else None)
+    try:
+        imported, rejected = import_rows(kind, read_rows(stream, format), batch_size=batch_size,
+                                         transaction_size=transaction_size, on_reject=on_reject)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    elapsed = time.monotonic() - started
+    invalidate(kind)
+    click.echo(f'Imported {imported} {kind}, rejected {rejected} rows in {elapsed:.1f}s '
+               f'({(imported + rejected) / max(elapsed, 1e-6):.0f} rows/sec)')
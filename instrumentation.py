@@ -0,0 +1,118 @@
+import heapq
+import json
+import time
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-request SQL instrumentation.
+#
+# Every statement run while handling a request is timed (before/after_cursor_execute) and
+# added to the request's RequestStats: statement count, total database time and the
+# INSTRUMENTATION_SLOWEST slowest statements. Each response gets a Server-Timing header
+# (`db` and `app` durations, shown by the browser dev tools) when SERVER_TIMING is set, and
+# one JSON log line is written once the response is sent; requests over SLOW_REQUEST_MS or
+# SLOW_REQUEST_STATEMENTS are logged as warnings with their slowest statements.
+#
+# For streamed pages the header only covers the work done before the body starts, the log
+# line covers the whole response.
+
+
+class RequestStats:
+    def __init__(self, keep_slowest):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.keep_slowest = keep_slowest
+        # min-heap of (duration, statement), the fastest of the kept ones first
+        self._slowest = []
+
+    def record(self, statement, duration, executemany=False):
+        self.statements += 1
+        self.db_time += duration
+        if self.keep_slowest:
+            if executemany:
+                statement = f'{statement} [executemany]'
+            entry = (duration, statement)
+            if len(self._slowest) < self.keep_slowest:
+                heapq.heappush(self._slowest, entry)
+            elif entry > self._slowest[0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self):
+        return sorted(self._slowest, reverse=True)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def _stats():
+    # statements run outside of a request (CLI commands, startup) are not recorded
+    if has_app_context():
+        return g.get('request_stats')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # kept on the execution context, which goes away with the statement even when it fails
+    context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = context._query_started
+    stats = _stats()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started, executemany)
+
+
+def _start_request():
+    g.request_stats = RequestStats(current_app.config.get('INSTRUMENTATION_SLOWEST', 3))
+
+
+def _server_timing(stats):
+    return 'db;dur={:.1f};desc="{} statements", app;dur={:.1f}'.format(
+        stats.db_time * 1000, stats.statements, stats.elapsed() * 1000)
+
+
+def _log(app, stats, method, path, endpoint, status):
+    elapsed_ms = stats.elapsed() * 1000
+    slow = elapsed_ms > app.config.get('SLOW_REQUEST_MS', 500) or \
+        stats.statements > app.config.get('SLOW_REQUEST_STATEMENTS', 20)
+    line = {
+        "method": method,
+        "path": path,
+        "endpoint": endpoint,
+        "status": status,
+        "duration_ms": round(elapsed_ms, 1),
+        "db_statements": stats.statements,
+        "db_ms": round(stats.db_time * 1000, 1),
+    }
+    if slow:
+        line["slow"] = True
+        line["slowest"] = [{"ms": round(duration * 1000, 1), "statement": " ".join(statement.split())[:500]}
+                           for duration, statement in stats.slowest()]
+        app.logger.warning(json.dumps(line))
+    else:
+        app.logger.info(json.dumps(line))
+
+
+def _finish_request(response):
+    stats = g.get('request_stats')
+    if stats is None:
+        return response
+    if current_app.config.get('SERVER_TIMING'):
+        response.headers['Server-Timing'] = _server_timing(stats)
+    # logged once the body is sent, streamed responses included
+    args = (current_app._get_current_object(), stats, request.method, request.full_path.rstrip('?'),
+            request.endpoint, response.status_code)
+    response.call_on_close(lambda: _log(*args))
+    return response
+
+
+def init_app(app):
+    if not app.config.get('INSTRUMENTATION_ENABLED', True):
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,257 @@
+import os
+import random
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import click
+from flask import current_app, g, has_request_context
+from flask.cli import with_appcontext
+from sqlalchemy import func, or_
+from models import db, Job
+from cache import invalidate
+from summary import refresh_venues
+
+# Background jobs for the write side work that doesn't have to delay a response and has to
+# happen even if the process dies after the commit: the venue summary refresh. Work on state
+# of the web process itself stays in the handlers, right after their commit: invalidating the
+# memory cache and updating the ngram search index. A job runs in whichever process claims
+# it, so it can only change the database or shared services.
+#
+# enqueue() adds a row to the `job` outbox table in the transaction of the change, so a job
+# exists if and only if the change was committed, and survives restarts. A Worker claims
+# due jobs (a lease: locked_by/locked_until, so several workers can share the table) and
+# runs them on a thread pool. The database work of a job is committed together with the
+# deletion of its row unless the job commits itself; a job that fails is retried with
+# exponential backoff, up to JOB_MAX_ATTEMPTS times, then kept with failed_at set. Jobs must
+# be idempotent: a job whose lease expired (worker killed) runs again.
+#
+# With JOB_WORKER_IN_PROCESS each web process runs a Worker, woken after every request that
+# enqueued jobs, which it claims first (any other worker may have claimed them already).
+# `flask worker` runs a Worker on its own, e.g. for jobs left over when the web processes
+# are stopped.
+
+HANDLERS = {}
+
+
+def job(name):
+    """Registers the decorated function as the handler of the jobs called `name`, it gets
+    the payload as keyword arguments."""
+    def register(handler):
+        HANDLERS[name] = handler
+        return handler
+    return register
+
+
+def enqueue(job_name, **payload):
+    """Adds a job to the current transaction, it runs once the transaction is committed."""
+    if job_name not in HANDLERS:
+        raise KeyError(f'Unknown job {job_name}')
+    entry = Job(name=job_name, payload=payload)
+    db.session.add(entry)
+    # the id tells the worker of this process which jobs to run first
+    db.session.flush()
+    if has_request_context():
+        g.setdefault('enqueued_jobs', []).append(entry.id)
+    return entry
+
+
+def backoff(attempts, base, maximum):
+    # exponential with jitter, so jobs failing together don't retry together
+    return min(maximum, base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+
+class Worker:
+    def __init__(self, app, threads=2, poll_interval=1.0):
+        self.app = app
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.token = f'{socket.gethostname()}:{os.getpid()}:{id(self):x}'
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._wanted = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def wake(self, job_ids=()):
+        """Claims jobs now instead of at the next poll, `job_ids` first."""
+        with self._lock:
+            self._wanted.extend(job_ids)
+        self._wake.set()
+
+    def _claim(self, limit, ids=None):
+        now = datetime.utcnow()
+        lease = now + timedelta(seconds=self.app.config.get('JOB_LEASE_SECONDS', 300))
+        claimable = (Job.failed_at.is_(None), Job.run_at <= now,
+                     or_(Job.locked_until.is_(None), Job.locked_until < now))
+        query = db.session.query(Job.id).filter(*claimable)
+        if ids is not None:
+            query = query.filter(Job.id.in_(ids))
+        # rows locked by a concurrent claim are left to it (Postgres, ignored by SQLite)
+        candidates = [id for id, in query.order_by(Job.run_at, Job.id).limit(limit).with_for_update(skip_locked=True)]
+        if not candidates:
+            db.session.rollback()
+            return []
+        # the conditions are checked again by the update, a job goes to one worker only
+        db.session.execute(Job.__table__.update()
+                           .where(Job.id.in_(candidates), *claimable)
+                           .values(locked_by=self.token, locked_until=lease))
+        db.session.commit()
+        return db.session.query(Job.id, Job.name, Job.payload, Job.attempts) \
+            .filter(Job.id.in_(candidates), Job.locked_by == self.token, Job.locked_until == lease) \
+            .order_by(Job.run_at, Job.id) \
+            .all()
+
+    def claim(self):
+        """Claims as many due jobs as there are idle threads, the awaited ones first."""
+        with self._lock:
+            free = self.threads - self._in_flight
+            if free <= 0:
+                return []
+            wanted, self._wanted = self._wanted, []
+        with self.app.app_context():
+            claimed = self._claim(free, wanted) if wanted else []
+            if len(claimed) < free:
+                claimed += self._claim(free - len(claimed))
+        return claimed
+
+    def run_job(self, id, name, payload, attempts):
+        config = self.app.config
+        with self.app.app_context():
+            try:
+                HANDLERS[name](**payload)
+                # the job's database work and its removal from the outbox commit together
+                db.session.execute(Job.__table__.delete().where(Job.id == id, Job.locked_by == self.token))
+                db.session.commit()
+                return True
+            except Exception:
+                db.session.rollback()
+                error = traceback.format_exc(limit=5)
+            attempts += 1
+            now = datetime.utcnow()
+            values = {'attempts': attempts, 'last_error': error[-4000:], 'locked_by': None, 'locked_until': None}
+            if attempts >= config.get('JOB_MAX_ATTEMPTS', 8):
+                values['failed_at'] = now
+                self.app.logger.error(f'Job {id} {name} failed {attempts} times, giving up: {error}')
+            else:
+                delay = backoff(attempts, config.get('JOB_BACKOFF_SECONDS', 2), config.get('JOB_BACKOFF_MAX_SECONDS', 600))
+                values['run_at'] = now + timedelta(seconds=delay)
+                self.app.logger.warning(f'Job {id} {name} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}')
+            db.session.execute(Job.__table__.update().where(Job.id == id, Job.locked_by == self.token).values(**values))
+            db.session.commit()
+            return False
+
+    def _done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+        # a thread is free, claim more right away
+        self._wake.set()
+
+    def _submit(self, claimed):
+        with self._lock:
+            self._in_flight += len(claimed)
+        for row in claimed:
+            self._pool.submit(self.run_job, *row).add_done_callback(self._done)
+
+    def run(self, once=False):
+        """Claims and runs jobs until stop() is called, or until no job is due with `once`."""
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                claimed = self.claim()
+            except Exception as e:
+                # database unavailable: try again at the next poll
+                self.app.logger.error(f'Claiming jobs failed: {e}')
+                claimed = []
+            self._submit(claimed)
+            if once and not claimed:
+                with self._lock:
+                    idle = self._in_flight == 0
+                if idle:
+                    return
+            if not claimed:
+                self._wake.wait(self.poll_interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='job-worker', daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and wait:
+            self._thread.join()
+        self._pool.shutdown(wait=wait)
+
+
+# the Worker of this web process, started by the first request
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _start_worker():
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                app = current_app._get_current_object()
+                worker = Worker(app, threads=app.config.get('JOB_WORKER_THREADS', 2),
+                                poll_interval=app.config.get('JOB_POLL_INTERVAL', 1.0))
+                worker.start()
+                _worker = worker
+
+
+def _wake_worker(response):
+    enqueued = g.get('enqueued_jobs')
+    if enqueued and _worker is not None:
+        _worker.wake(enqueued)
+    return response
+
+
+def init_app(app):
+    if not app.config.get('JOB_WORKER_IN_PROCESS', True):
+        return
+    app.before_request(_start_worker)
+    app.after_request(_wake_worker)
+
+
+@click.command('worker')
+@click.option('--threads', type=int, help='Jobs run at once, JOB_WORKER_THREADS by default.')
+@click.option('--once', is_flag=True, help='Run the jobs due now and exit.')
+@click.option('--retry-failed', is_flag=True, help='Queue the jobs that failed for good again first.')
+@with_appcontext
+def worker_command(threads, once, retry_failed):
+    """Run the background jobs queued by the web handlers."""
+    app = current_app._get_current_object()
+    if retry_failed:
+        retried = db.session.execute(Job.__table__.update()
+                                     .where(Job.failed_at.isnot(None))
+                                     .values(failed_at=None, attempts=0, run_at=datetime.utcnow())).rowcount
+        db.session.commit()
+        click.echo(f'Queued {retried} failed jobs again')
+    queued, failed = db.session.query(func.count(Job.id), func.count(Job.failed_at)).one()
+    click.echo(f'{queued - failed} jobs queued, {failed} failed')
+    db.session.close()
+    worker = Worker(app, threads=threads or app.config.get('JOB_WORKER_THREADS', 2),
+                    poll_interval=app.config.get('JOB_POLL_INTERVAL', 1.0))
+    try:
+        worker.run(once=once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.stop()
+
+
+#  Jobs
+#  ----------------------------------------------------------------
+
+@job('refresh_venues')
+def refresh_venues_job(venue_ids, tags=()):
+    # refresh_venues() bumps the version of /venues, so every process builds the page again;
+    # the tags also drop the old copies from a shared cache once the new rows are committed
+    refresh_venues(venue_ids)
+    db.session.commit()
+    invalidate(*tags)
@@ -0,0 +1,278 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from flask import current_app, g, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+from models import db
+from cache import get_cache
+
+# Prometheus metrics, served as text by /metrics.
+#
+# Counters and histograms live in this process (a dict update under a lock per event):
+# requests by endpoint/method/status, request latency by endpoint, template render time,
+# database pool checkouts. Pool and cache figures are read from the engine and the cache
+# backend when metrics are collected.
+#
+# Under gunicorn every worker has its own values. With METRICS_DIR set, each process
+# writes its values to METRICS_DIR/<pid>.json (at most every METRICS_FLUSH_INTERVAL
+# seconds, and at exit) and /metrics adds up the files of all processes, so any worker can
+# answer the scrape. Counters of workers that exited are kept, gauges only count live
+# workers. Empty the directory when the server starts.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'fyyur_http_requests_total': ('counter', 'Requests handled, by endpoint, method and status.'),
+    'fyyur_http_request_duration_seconds': ('histogram', 'Time to handle a request and send its body, by endpoint.'),
+    'fyyur_template_render_seconds': ('histogram', 'Time to render a template, by template.'),
+    'fyyur_db_pool_checkouts_total': ('counter', 'Connections checked out of the pool.'),
+    'fyyur_db_pool_size': ('gauge', 'Connections the pool keeps open.'),
+    'fyyur_db_pool_checked_out': ('gauge', 'Connections currently checked out.'),
+    'fyyur_db_pool_overflow': ('gauge', 'Connections open beyond the pool size (negative: not opened yet).'),
+    'fyyur_cache_hits_total': ('counter', 'Page cache hits.'),
+    'fyyur_cache_misses_total': ('counter', 'Page cache misses.'),
+}
+
+
+def pool_stats():
+    """Connection pool usage of the engine, only pools that keep connections (QueuePool) report them."""
+    pool = db.engine.pool
+    stats = {"pool": type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (name, labels) -> value, labels as a tuple of (label, value) pairs
+        self.counters = {}
+        # (name, labels) -> [count per bucket..., count, sum]
+        self.histograms = {}
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+
+registry = Registry()
+
+
+def _gauges():
+    # values read now rather than counted, per process
+    stats = pool_stats()
+    gauges = {'counters': [], 'gauges': []}
+    for name, key in (('fyyur_db_pool_size', 'size'), ('fyyur_db_pool_checked_out', 'checkedout'),
+                      ('fyyur_db_pool_overflow', 'overflow')):
+        if key in stats:
+            gauges['gauges'].append([name, (), stats[key]])
+    cache = get_cache().stats()
+    gauges['counters'].append(['fyyur_cache_hits_total', (), cache['hits']])
+    gauges['counters'].append(['fyyur_cache_misses_total', (), cache['misses']])
+    return gauges
+
+
+def _collect_process():
+    snapshot = registry.snapshot()
+    sampled = _gauges()
+    snapshot['counters'] += sampled['counters']
+    snapshot['gauges'] = sampled['gauges']
+    return snapshot
+
+
+def _write(directory, snapshot):
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(snapshots):
+    # snapshots: [(pid, snapshot)], counters and histograms are summed, gauges of live processes too
+    counters, histograms, gauges = {}, {}, {}
+    for pid, snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                merged[i] += value
+        if _alive(pid):
+            for name, labels, value in snapshot.get('gauges', ()):
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0) + value
+    return counters, histograms, gauges
+
+
+def collect():
+    """Returns (counters, histograms, gauges) of this process, or of all processes writing
+    to METRICS_DIR."""
+    snapshot = _collect_process()
+    directory = current_app.config.get('METRICS_DIR')
+    if not directory:
+        return _merge([(os.getpid(), snapshot)])
+    _write(directory, snapshot)
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path) as f:
+                snapshots.append((int(os.path.basename(path)[:-len('.json')]), json.load(f)))
+        except (OSError, ValueError):
+            # a file being replaced or of another program
+            continue
+    return _merge(snapshots)
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"'))
+                          for name, value in pairs) + '}'
+
+
+def render():
+    """Text exposition format of all metrics."""
+    counters, histograms, gauges = collect()
+    samples = {}
+    for (name, labels), value in sorted(counters.items()):
+        samples.setdefault(name, []).append(f'{name}{_labels(labels)} {value}')
+    for (name, labels), value in sorted(gauges.items()):
+        samples.setdefault(name, []).append(f'{name}{_labels(labels)} {value}')
+    for (name, labels), values in sorted(histograms.items()):
+        lines = samples.setdefault(name, [])
+        for bound, count in zip(LATENCY_BUCKETS, values):
+            lines.append(f'{name}_bucket{_labels(labels, le=bound)} {count}')
+        lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {values[-2]}')
+        lines.append(f'{name}_count{_labels(labels)} {values[-2]}')
+        lines.append(f'{name}_sum{_labels(labels)} {values[-1]}')
+    output = []
+    for name, (kind, help) in METRICS.items():
+        if name in samples:
+            output.append(f'# HELP {name} {help}')
+            output.append(f'# TYPE {name} {kind}')
+            output.extend(samples[name])
+    return '\n'.join(output) + '\n'
+
+
+class TimedTemplate(Template):
+    def _observe(self, duration):
+        registry.observe('fyyur_template_render_seconds', duration, (('template', self.name or 'string'),))
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            self._observe(time.perf_counter() - started)
+
+    def generate(self, *args, **kwargs):
+        # streamed templates (stream_template()): only the time spent producing chunks is
+        # counted, not the time the response waits for the client between them. Observed
+        # when the stream ends, or is closed early (client gone).
+        chunks = super().generate(*args, **kwargs)
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield chunk
+        finally:
+            chunks.close()
+            self._observe(elapsed)
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+
+
+def _observe(app, started, endpoint, method, status):
+    registry.observe('fyyur_http_request_duration_seconds', time.perf_counter() - started,
+                     (('endpoint', endpoint),))
+    registry.inc('fyyur_http_requests_total', (('endpoint', endpoint), ('method', method), ('status', status)))
+    directory = app.config.get('METRICS_DIR')
+    if directory and time.monotonic() - _flushed[0] > app.config.get('METRICS_FLUSH_INTERVAL', 1):
+        _flushed[0] = time.monotonic()
+        with app.app_context():
+            _write(directory, _collect_process())
+
+
+# time of the last write to METRICS_DIR by this process
+_flushed = [0.0]
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    registry.inc('fyyur_db_pool_checkouts_total')
+
+
+def _finish_request(response):
+    started = g.get('metrics_started')
+    if started is not None:
+        # observed once the body is sent, streamed responses included
+        args = (current_app._get_current_object(), started, request.endpoint or 'none', request.method,
+                str(response.status_code))
+        response.call_on_close(lambda: _observe(*args))
+    return response
+
+
+def init_app(app):
+    app.jinja_env.template_class = TimedTemplate
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+    if not event.contains(Pool, 'checkout', _checkout):
+        event.listen(Pool, 'checkout', _checkout)
+
+    directory = app.config.get('METRICS_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+        def flush_at_exit():
+            with app.app_context():
+                _write(directory, _collect_process())
+        atexit.register(flush_at_exit)
@@ -0,0 +1,36 @@
+"""add updated_at to Venue, Artist and Show
+
+Revision ID: 3f0d6b8e21ac
+Revises: 7c3e9a1f52b4
+Create Date: 2026-10-18 19:02:17.640825
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f0d6b8e21ac'
+down_revision = '7c3e9a1f52b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing rows get the migration time in UTC like the models set it from then on
+    # (datetime.utcnow), not CURRENT_TIMESTAMP which is the session's local time on Postgres
+    migrated_at = datetime.utcnow()
+    for table in ('Venue', 'Artist', 'Show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(sa.table(table, sa.column('updated_at')).update().values(updated_at=migrated_at))
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+        op.create_index(op.f(f'ix_{table}_updated_at'), table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in ('Show', 'Artist', 'Venue'):
+        op.drop_index(op.f(f'ix_{table}_updated_at'), table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,42 @@
+"""make the listing sort columns NOT NULL
+
+Revision ID: 54da41c378f0
+Revises: e7a2f95c1d40
+Create Date: 2026-10-19 09:12:44.208315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '54da41c378f0'
+down_revision = 'e7a2f95c1d40'
+branch_labels = None
+depends_on = None
+
+# the keyset pagination of queries.py compares (sort key) tuples, a NULL in one makes the
+# comparison NULL and the rows after it are skipped
+SORT_COLUMNS = (
+    ('Venue', 'state', sa.String(length=120)),
+    ('Venue', 'city', sa.String(length=120)),
+    ('Artist', 'name', sa.String()),
+    ('venue_area_summary', 'state', sa.String(length=120)),
+    ('venue_area_summary', 'city', sa.String(length=120)),
+)
+
+
+def upgrade():
+    # the forms require these fields, rows without them can only come from older data
+    for table, column, _ in SORT_COLUMNS:
+        t = sa.table(table, sa.column(column))
+        op.execute(t.update().where(t.c[column].is_(None)).values({column: ''}))
+    for table, column, type_ in SORT_COLUMNS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(column, existing_type=type_, nullable=False)
+
+
+def downgrade():
+    for table, column, type_ in reversed(SORT_COLUMNS):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(column, existing_type=type_, nullable=True)
@@ -0,0 +1,29 @@
+"""add page_version
+
+Revision ID: 7a284f3b08d5
+Revises: 54da41c378f0
+Create Date: 2026-10-19 10:03:27.915402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a284f3b08d5'
+down_revision = '54da41c378f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # no rows: every page starts at version 0 and gets a new ETag on its next change
+    op.create_table('page_version',
+    sa.Column('tag', sa.String(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('tag')
+    )
+
+
+def downgrade():
+    op.drop_table('page_version')
@@ -0,0 +1,76 @@
+"""add indexes for show lookups, listings and search
+
+Revision ID: 7c3e9a1f52b4
+Revises: 1501744d5439
+Create Date: 2026-10-18 18:20:41.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3e9a1f52b4'
+down_revision = '1501744d5439'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == 'postgresql'
+
+    # Genre.name becomes unique, so first merge duplicated genres into the one with the lowest id
+    for relation, owner in (('artist_genre_relation', 'artist_id'), ('venue_genre_relation', 'venue_id')):
+        # drop links that would become duplicates once repointed to the kept genre
+        op.execute(f'''
+            DELETE FROM {relation}
+            WHERE genre_id NOT IN (SELECT MIN(id) FROM "Genre" GROUP BY name)
+              AND EXISTS (
+                SELECT 1 FROM {relation} AS kept
+                WHERE kept.{owner} = {relation}.{owner}
+                  AND kept.genre_id = (
+                    SELECT MIN(g2.id) FROM "Genre" g1 JOIN "Genre" g2 ON g2.name = g1.name
+                    WHERE g1.id = {relation}.genre_id
+                  )
+              )
+        ''')
+        op.execute(f'''
+            UPDATE {relation}
+            SET genre_id = (
+                SELECT MIN(g2.id) FROM "Genre" g1 JOIN "Genre" g2 ON g2.name = g1.name
+                WHERE g1.id = {relation}.genre_id
+            )
+            WHERE genre_id NOT IN (SELECT MIN(id) FROM "Genre" GROUP BY name)
+        ''')
+    op.execute('DELETE FROM "Genre" WHERE id NOT IN (SELECT MIN(id) FROM "Genre" GROUP BY name)')
+    op.create_index(op.f('ix_Genre_name'), 'Genre', ['name'], unique=True)
+
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'], unique=False)
+    op.create_index('ix_Venue_state_city_id', 'Venue', ['state', 'city', 'id'], unique=False)
+    op.create_index('ix_Artist_name_id', 'Artist', ['name', 'id'], unique=False)
+    op.create_index('ix_artist_genre_relation_artist_id', 'artist_genre_relation', ['artist_id'], unique=False)
+    op.create_index('ix_venue_genre_relation_venue_id', 'venue_genre_relation', ['venue_id'], unique=False)
+
+    # name ILIKE '%term%' can only use a trigram index, which needs pg_trgm
+    if is_postgres:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_Venue_name_trgm', 'Venue', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_Artist_name_trgm', 'Artist', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_Artist_name_trgm', table_name='Artist')
+    op.drop_index('ix_Venue_name_trgm', table_name='Venue')
+    op.drop_index('ix_venue_genre_relation_venue_id', table_name='venue_genre_relation')
+    op.drop_index('ix_artist_genre_relation_artist_id', table_name='artist_genre_relation')
+    op.drop_index('ix_Artist_name_id', table_name='Artist')
+    op.drop_index('ix_Venue_state_city_id', table_name='Venue')
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
+    op.drop_index(op.f('ix_Genre_name'), table_name='Genre')
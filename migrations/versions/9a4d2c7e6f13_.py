@@ -0,0 +1,54 @@
+"""add venue_area_summary
+
+Revision ID: 9a4d2c7e6f13
+Revises: 3f0d6b8e21ac
+Create Date: 2026-10-18 20:41:05.318214
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4d2c7e6f13'
+down_revision = '3f0d6b8e21ac'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('venue_area_summary',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('state', sa.String(length=120), nullable=True),
+    sa.Column('city', sa.String(length=120), nullable=True),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('num_upcoming_shows', sa.Integer(), nullable=False),
+    sa.Column('next_show_time', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id')
+    )
+    op.create_index('ix_venue_area_summary_state_city_venue_id', 'venue_area_summary',
+                    ['state', 'city', 'venue_id'], unique=False)
+    op.create_index(op.f('ix_venue_area_summary_next_show_time'), 'venue_area_summary', ['next_show_time'], unique=False)
+    op.create_index(op.f('ix_venue_area_summary_updated_at'), 'venue_area_summary', ['updated_at'], unique=False)
+
+    # fill the table, show start times are stored as naive local times
+    op.get_bind().execute(sa.text('''
+        INSERT INTO venue_area_summary (venue_id, state, city, name, num_upcoming_shows, next_show_time, updated_at)
+        SELECT v.id, v.state, v.city, v.name,
+               COUNT(CASE WHEN s.start_time > :now THEN s.id END),
+               MIN(CASE WHEN s.start_time > :now THEN s.start_time END),
+               :updated_at
+        FROM "Venue" AS v LEFT OUTER JOIN "Show" AS s ON s.venue_id = v.id
+        GROUP BY v.id, v.state, v.city, v.name
+    ''').bindparams(sa.bindparam('now', datetime.now(), type_=sa.DateTime),
+                    sa.bindparam('updated_at', datetime.utcnow(), type_=sa.DateTime)))
+
+
+def downgrade():
+    op.drop_index(op.f('ix_venue_area_summary_updated_at'), table_name='venue_area_summary')
+    op.drop_index(op.f('ix_venue_area_summary_next_show_time'), table_name='venue_area_summary')
+    op.drop_index('ix_venue_area_summary_state_city_venue_id', table_name='venue_area_summary')
+    op.drop_table('venue_area_summary')
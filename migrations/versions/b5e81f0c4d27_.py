@@ -0,0 +1,51 @@
+"""add show counters to Venue and Artist
+
+Revision ID: b5e81f0c4d27
+Revises: 9a4d2c7e6f13
+Create Date: 2026-10-18 21:36:52.904127
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e81f0c4d27'
+down_revision = '9a4d2c7e6f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.add_column(sa.Column('is_past', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.create_index('ix_Show_is_past_start_time', 'Show', ['is_past', 'start_time'], unique=False)
+    for table in ('Venue', 'Artist'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('upcoming_shows_count', sa.Integer(), nullable=False, server_default='0'))
+            batch_op.add_column(sa.Column('past_shows_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # count the existing shows, show start times are stored as naive local times
+    show = sa.table('Show', sa.column('id'), sa.column('start_time'), sa.column('is_past', sa.Boolean),
+                    sa.column('venue_id'), sa.column('artist_id'))
+    op.execute(show.update().where(show.c.start_time <= datetime.now()).values(is_past=True))
+    for table, owner in (('Venue', show.c.venue_id), ('Artist', show.c.artist_id)):
+        owner_table = sa.table(table, sa.column('id'), sa.column('upcoming_shows_count'), sa.column('past_shows_count'))
+
+        def count(is_past):
+            return sa.select(sa.func.count(show.c.id)) \
+                .where(owner == owner_table.c.id, show.c.is_past == is_past) \
+                .scalar_subquery()
+        op.execute(owner_table.update().values(upcoming_shows_count=count(sa.false()),
+                                               past_shows_count=count(sa.true())))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('past_shows_count')
+            batch_op.drop_column('upcoming_shows_count')
+    op.drop_index('ix_Show_is_past_start_time', table_name='Show')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('is_past')
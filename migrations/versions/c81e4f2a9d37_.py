@@ -0,0 +1,36 @@
+"""add the maximum show duration constraint
+
+Revision ID: c81e4f2a9d37
+Revises: 7a284f3b08d5
+Create Date: 2026-10-19 11:26:08.204513
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81e4f2a9d37'
+down_revision = '7a284f3b08d5'
+branch_labels = None
+depends_on = None
+
+# MAX_SHOW_DURATION of models.py, the SQL of models.ShowDurationAtMost per dialect
+MAX_SHOW_SECONDS = 24 * 60 * 60
+CONDITIONS = {
+    'postgresql': f"end_time - start_time <= interval '{MAX_SHOW_SECONDS} seconds'",
+    'sqlite': f"strftime('%s', end_time) - strftime('%s', start_time) <= {MAX_SHOW_SECONDS}",
+}
+
+
+def upgrade():
+    condition = CONDITIONS.get(op.get_bind().dialect.name, CONDITIONS['postgresql'])
+    # fails on shows longer than that: they were written by hand, the forms and the
+    # importer never allowed more than 24 hours
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.create_check_constraint('ck_Show_max_duration', condition)
+
+
+def downgrade():
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_constraint('ck_Show_max_duration', type_='check')
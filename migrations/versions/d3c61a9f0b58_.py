@@ -0,0 +1,74 @@
+"""add Show.end_time and the show overlap constraints
+
+Revision ID: d3c61a9f0b58
+Revises: b5e81f0c4d27
+Create Date: 2026-10-18 22:14:37.561802
+
+"""
+import logging
+from datetime import timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3c61a9f0b58'
+down_revision = 'b5e81f0c4d27'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic')
+
+# existing shows get the default duration of models.py
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+
+OVERLAP_CONSTRAINTS = (
+    ('ex_Show_venue_overlap', 'venue_id'),
+    ('ex_Show_artist_overlap', 'artist_id'),
+)
+
+
+def _overlapping(column):
+    return sa.text(f'SELECT 1 FROM "Show" a JOIN "Show" b ON a.{column} = b.{column} AND a.id < b.id '
+                   'AND a.start_time < b.end_time AND b.start_time < a.end_time LIMIT 1')
+
+
+def upgrade():
+    bind = op.get_bind()
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.add_column(sa.Column('end_time', sa.DateTime(), nullable=True))
+
+    show = sa.table('Show', sa.column('id'), sa.column('start_time', sa.DateTime), sa.column('end_time', sa.DateTime))
+    if bind.dialect.name == 'postgresql':
+        op.execute(show.update().values(end_time=show.c.start_time + sa.text("interval '2 hours'")))
+    else:
+        # no portable date arithmetic, computed here
+        rows = bind.execute(sa.select(show.c.id, show.c.start_time)).all()
+        if rows:
+            bind.execute(show.update().where(show.c.id == sa.bindparam('_id')).values(end_time=sa.bindparam('_end')),
+                         [{'_id': id, '_end': start_time + DEFAULT_SHOW_DURATION} for id, start_time in rows])
+
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_check_constraint('ck_Show_end_after_start', 'end_time > start_time')
+
+    if bind.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        for name, column in OVERLAP_CONSTRAINTS:
+            if bind.execute(_overlapping(column)).first() is not None:
+                # the constraint can't be created over overlapping shows
+                logger.warning('Shows of a %s overlap, %s not created: '
+                               'resolve them (flask conflicts) then run `flask conflicts --constrain`',
+                               column[:-3], name)
+                continue
+            op.execute(f'ALTER TABLE "Show" ADD CONSTRAINT "{name}" '
+                       f'EXCLUDE USING gist ({column} WITH =, tsrange(start_time, end_time) WITH &&)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for name, _ in OVERLAP_CONSTRAINTS:
+            op.execute(f'ALTER TABLE "Show" DROP CONSTRAINT IF EXISTS "{name}"')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_constraint('ck_Show_end_after_start', type_='check')
+        batch_op.drop_column('end_time')
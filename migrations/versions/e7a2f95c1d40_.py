@@ -0,0 +1,38 @@
+"""add the job outbox table
+
+Revision ID: e7a2f95c1d40
+Revises: d3c61a9f0b58
+Create Date: 2026-10-18 23:02:11.274519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2f95c1d40'
+down_revision = 'd3c61a9f0b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('run_at', sa.DateTime(), nullable=False),
+    sa.Column('locked_by', sa.String(length=128), nullable=True),
+    sa.Column('locked_until', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('failed_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_job_failed_at_run_at', 'job', ['failed_at', 'run_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_job_failed_at_run_at', table_name='job')
+    op.drop_table('job')
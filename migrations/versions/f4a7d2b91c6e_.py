@@ -0,0 +1,28 @@
+"""drop the queued search index jobs
+
+Revision ID: f4a7d2b91c6e
+Revises: c81e4f2a9d37
+Create Date: 2026-10-19 14:48:51.370219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a7d2b91c6e'
+down_revision = 'c81e4f2a9d37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the handlers update the search index of their own process now, these jobs have no
+    # handler any more and would only fail until they are given up
+    job = sa.table('job', sa.column('name', sa.String))
+    op.execute(job.delete().where(job.c.name.in_(['index_document', 'remove_document'])))
+
+
+def downgrade():
+    # the index of each process is rebuilt from the database when it starts
+    pass
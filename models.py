@@ -1,32 +1,47 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy import DDL, event, false, Boolean
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from datetime import datetime, timedelta
 # Creating a genre Class, this will be the child class for both Venue and Artist
 # there will be a many to many relation b/w (genre and artist)  and (genre and venue)
 db = SQLAlchemy()
 class Genre(db.Model):
     __tablename__ = 'Genre'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    # genre names are looked up on every venue/artist submission
+    name = db.Column(db.String, unique=True, index=True)
 
 # Genre Model and Artist Model has many to many relationship
 artist_genre_relation = db.Table('artist_genre_relation',
     db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
-    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id'), primary_key=True)
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id'), primary_key=True),
+    # the primary key starts with genre_id, loading the genres of an artist needs its own index
+    db.Index('ix_artist_genre_relation_artist_id', 'artist_id')
 )
 
 # Genre Model and Venue Model has many to many relationship
 venue_genre_relation = db.Table('venue_genre_relation',
     db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
-    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id'), primary_key=True)
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id'), primary_key=True),
+    db.Index('ix_venue_genre_relation_venue_id', 'venue_id')
 )
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        # /venues lists venues ordered by (state, city, id)
+        db.Index('ix_Venue_state_city_id', 'state', 'city', 'id'),
+        # trigram index used by the ILIKE '%term%' search on Postgres, a plain index elsewhere
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
+    # sort keys of the listings (keyset pagination compares them, they can't be NULL)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
@@ -38,6 +53,11 @@ class Venue(db.Model):
     seeking_description = db.Column(db.String(120))
     # below line is to create a one to many relation with Show modal
     shows = db.relationship('Show', backref='venue', lazy=True)    # Can reference show.venue (as well as venue.shows)
+    # number of shows by Show.is_past, maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # last change of the row, for incremental exports (exporter.py, updated_since)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     def __repr__(self):
         return f'<Venue {self.id} {self.name}>'
@@ -45,9 +65,16 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        # /artists lists artists ordered by (name, id)
+        db.Index('ix_Artist_name_id', 'name', 'id'),
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    # sort key of the listing (keyset pagination compares it, it can't be NULL)
+    name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
@@ -60,18 +87,158 @@ class Artist(db.Model):
     seeking_description = db.Column(db.String(120))
     # just like for Venue, below statement is to create a one to many relatiuon with Show
     shows = db.relationship('Show', backref='artist', lazy=True)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     def __repr__(self):
         return f'<Artist {self.id} {self.name}>'
 
+def _started(context):
+    start_time = context.get_current_parameters().get('start_time')
+    return start_time is not None and start_time <= datetime.now()
+
+# shows created without an end time last this long, no show lasts longer than MAX_SHOW_DURATION
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+MAX_SHOW_DURATION = timedelta(hours=24)
+
+def _default_end(context):
+    start_time = context.get_current_parameters().get('start_time')
+    return start_time + DEFAULT_SHOW_DURATION if start_time is not None else None
+
+class ShowDurationAtMost(ColumnElement):
+    """`end_time - start_time <= duration` of the Show row, in the SQL of each dialect."""
+    type = Boolean()
+
+    def __init__(self, duration):
+        self.duration = duration
+
+@compiles(ShowDurationAtMost)
+def _duration_interval(element, compiler, **kw):
+    # timestamp arithmetic of Postgres and standard SQL
+    return f"end_time - start_time <= interval '{int(element.duration.total_seconds())} seconds'"
+
+@compiles(ShowDurationAtMost, 'sqlite')
+def _duration_seconds(element, compiler, **kw):
+    # SQLite stores datetimes as text, compared as whole seconds since the epoch
+    return f"strftime('%s', end_time) - strftime('%s', start_time) <= {int(element.duration.total_seconds())}"
+
 # Creating show Class for Show page in the UI, all the fields have been created by reviewing the UI
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        # shows of a venue/artist are always read together with a start_time filter or order
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        # /shows lists shows ordered by (start_time, id)
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+        # the counters rollover looks for shows not counted as past yet whose start time has passed
+        db.Index('ix_Show_is_past_start_time', 'is_past', 'start_time'),
+        db.CheckConstraint('end_time > start_time', name='ck_Show_end_after_start'),
+        # overlap checks (booking.py) only look back MAX_SHOW_DURATION from a start time,
+        # a longer show would be missed by them
+        db.CheckConstraint(ShowDurationAtMost(MAX_SHOW_DURATION), name='ck_Show_max_duration'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    end_time = db.Column(db.DateTime, nullable=False, default=_default_end)
 
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+    # whether the show is counted in the past_shows_count of its venue and artist, set when
+    # it is created and by the counters rollover once it has started (see counters.py)
+    is_past = db.Column(db.Boolean, nullable=False, default=_started, server_default=false())
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<Show {self.id} artistID={self.artist_id} venueID={self.venue_id}>'
+
+# Denormalized copy of the /venues listing: one row per venue with its area and number of
+# upcoming shows, kept up to date by summary.py
+class VenueAreaSummary(db.Model):
+    __tablename__ = 'venue_area_summary'
+    __table_args__ = (
+        # /venues lists venues ordered by (state, city, venue_id), area totals group by (state, city)
+        db.Index('ix_venue_area_summary_state_city_venue_id', 'state', 'city', 'venue_id'),
+    )
+
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True)
+    state = db.Column(db.String(120), nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    name = db.Column(db.String)
+    num_upcoming_shows = db.Column(db.Integer, nullable=False, default=0)
+    # start of the venue's next show: once it has passed, num_upcoming_shows is one too high
+    next_show_time = db.Column(db.DateTime, index=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
 
     def __repr__(self):
-        return f'<Show {self.id} artistID={self.artist_id} venueID={self.venue_id}>'
\ No newline at end of file
+        return f'<VenueAreaSummary {self.venue_id} {self.state}|{self.city} {self.num_upcoming_shows}>'
+
+# Version of each page, named by its cache tag, bumped by the writes changing the page
+# (versions.py) and read for its ETag
+class PageVersion(db.Model):
+    __tablename__ = 'page_version'
+
+    tag = db.Column(db.String, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<PageVersion {self.tag} {self.version}>'
+
+# Outbox of background jobs (jobs.py): a job is written in the transaction of the change
+# that needs it and deleted once it has run
+class Job(db.Model):
+    __tablename__ = 'job'
+    __table_args__ = (
+        # workers look for jobs not failed whose run_at has passed
+        db.Index('ix_job_failed_at_run_at', 'failed_at', 'run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # not run before then, pushed back after each failed attempt
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # the worker running the job, until its lease expires
+    locked_by = db.Column(db.String(128))
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    # set once the job has failed JOB_MAX_ATTEMPTS times, it isn't retried after that
+    failed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.name} attempts={self.attempts}>'
+
+# the gin_trgm_ops operator class used by the name indexes comes from the pg_trgm extension
+event.listen(
+    db.Model.metadata,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
+# On Postgres two shows of the same venue or artist can't overlap: exclusion constraints on
+# (venue_id|artist_id, tsrange(start_time, end_time)), btree_gist provides the = operator
+# class for the integer columns. Other databases rely on the checks of booking.py.
+SHOW_OVERLAP_CONSTRAINTS = (
+    ('ex_Show_venue_overlap', 'venue_id'),
+    ('ex_Show_artist_overlap', 'artist_id'),
+)
+
+def overlap_constraint_ddl(name, column):
+    # ranges include their start and exclude their end, back to back shows don't overlap
+    return f'ALTER TABLE "Show" ADD CONSTRAINT "{name}" ' \
+           f'EXCLUDE USING gist ({column} WITH =, tsrange(start_time, end_time) WITH &&)'
+
+event.listen(
+    db.Model.metadata,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql')
+)
+for _name, _column in SHOW_OVERLAP_CONSTRAINTS:
+    event.listen(
+        Show.__table__,
+        'after_create',
+        DDL(overlap_constraint_ddl(_name, _column)).execute_if(dialect='postgresql')
+    )
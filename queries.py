@@ -0,0 +1,381 @@
+import base64
+import json
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from sqlalchemy import and_, func, literal, or_, select, tuple_, DateTime, Integer, String
+from sqlalchemy.sql import Select
+from models import db, Venue, Artist, Show, Genre, VenueAreaSummary, artist_genre_relation
+from versions import page_versions
+
+# Read-side queries used by the controllers in app.py. Each function here issues
+# a fixed number of statements no matter how many rows are involved, so pages built
+# on top of them don't degrade into one query per venue/artist/show.
+
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+# Listing pages are paginated on the sort key rather than with OFFSET: the cursor is
+# the sort key of the last row on the page and the next page is read with
+# `WHERE (sort key) > cursor ORDER BY sort key LIMIT n`, a bounded index range scan.
+# Sort columns must be NOT NULL: a NULL in a row's key makes the comparison NULL and the
+# rows after it would never be reached.
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    # raises ValueError on anything that isn't a cursor produced by encode_cursor()
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError(f'Invalid cursor {cursor!r}')
+    if not isinstance(values, list):
+        raise ValueError(f'Invalid cursor {cursor!r}')
+    return values
+
+
+def keyset_page(query, sort_columns, sort_key, after=None, limit=50, descending=False):
+    """Returns (rows, next_cursor) for the page of `query` following the `after` cursor.
+
+    `query` is an ORM Query or a Core select. `sort_columns` must make the ordering
+    unique (end with the primary key) and `sort_key(row)` must return the values of
+    those columns for a row. With `descending` the pages walk the sort key from the
+    largest value down.
+    """
+    if after is not None:
+        if len(after) != len(sort_columns):
+            raise ValueError('Cursor does not match the sort order')
+        # bind the cursor values with the column types so e.g. datetimes are
+        # compared the way the dialect stores them
+        bounds = [literal(_cursor_value(column, value), type_=column.type)
+                  for column, value in zip(sort_columns, after)]
+        if descending:
+            query = query.filter(tuple_(*sort_columns) < tuple_(*bounds))
+        else:
+            query = query.filter(tuple_(*sort_columns) > tuple_(*bounds))
+    if descending:
+        query = query.order_by(*[column.desc() for column in sort_columns])
+    else:
+        query = query.order_by(*sort_columns)
+    # one extra row tells us whether there is a next page without a COUNT query
+    query = query.limit(limit + 1)
+    rows = db.session.execute(query).all() if isinstance(query, Select) else query.all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort_key(rows[-1]))
+    return rows, next_cursor
+
+
+def _cursor_value(column, value):
+    # cursors come from the query string: each value must fit its column's type, or the
+    # database would reject the statement (a 500 instead of a 400)
+    if isinstance(column.type, DateTime):
+        # encode_cursor() stores datetimes as ISO strings
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid cursor value {value!r}')
+    if isinstance(column.type, Integer):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        raise ValueError(f'Invalid cursor value {value!r}')
+    if isinstance(column.type, String):
+        # the sort columns are NOT NULL, a NULL would make the tuple comparison NULL
+        if isinstance(value, str):
+            return value
+        raise ValueError(f'Invalid cursor value {value!r}')
+    raise ValueError(f'Cannot paginate on {column}')
+
+
+#----------------------------------------------------------------------------#
+# Show counts.
+#----------------------------------------------------------------------------#
+
+def upcoming_show_counts(model, ids):
+    """Returns {id: number of upcoming shows} for the given Venue or Artist ids.
+
+    Reads the upcoming_shows_count counters (see counters.py) by primary key in one query;
+    ids that don't exist are present with a count of 0.
+    """
+    ids = list(ids)
+    if not ids:
+        return {}
+    counts = dict.fromkeys(ids, 0)
+    counts.update(db.session.query(model.id, model.upcoming_shows_count)
+                  .filter(model.id.in_(ids))
+                  .all())
+    return counts
+
+
+#----------------------------------------------------------------------------#
+# Listings.
+#----------------------------------------------------------------------------#
+
+# columns of the other side of a show listed on a venue/artist detail page
+_VENUE_SHOW_COLUMNS = (
+    Show.artist_id,
+    Artist.name.label('artist_name'),
+    Artist.image_link.label('artist_image_link'),
+)
+_ARTIST_SHOW_COLUMNS = (
+    Show.venue_id,
+    Venue.name.label('venue_name'),
+    Venue.image_link.label('venue_image_link'),
+)
+
+
+def _venue_area_query():
+    # read from the summary table maintained by summary.py, no join or GROUP BY over the shows
+    return db.session.query(
+        VenueAreaSummary.city,
+        VenueAreaSummary.state,
+        VenueAreaSummary.venue_id.label('id'),
+        VenueAreaSummary.name,
+        VenueAreaSummary.num_upcoming_shows
+    )
+
+
+def _group_areas(rows):
+    # rows are sorted by state, city so consecutive rows belong to the same area;
+    # lazy, each area's venues must be consumed before moving to the next area
+    for (city, state), venues in groupby(rows, key=itemgetter(0, 1)):
+        yield {
+            "city": city,
+            "state": state,
+            "venues": ({
+                "id": venue.id,
+                "name": venue.name,
+                "num_upcoming_shows": venue.num_upcoming_shows
+            } for venue in venues)
+        }
+
+
+def venue_areas(after=None, limit=50):
+    """Venues grouped by (city, state) with their number of upcoming shows.
+
+    Returns (areas, next_cursor) where areas is the structure `pages/venues.html` expects:
+    [{"city": ..., "state": ..., "venues": [{"id", "name", "num_upcoming_shows"}]}]
+    built from one page of venue_area_summary rows ordered by (state, city, venue_id).
+    """
+    rows, next_cursor = keyset_page(_venue_area_query(),
+                                    (VenueAreaSummary.state, VenueAreaSummary.city, VenueAreaSummary.venue_id),
+                                    lambda row: (row.state, row.city, row.id),
+                                    after=after, limit=limit)
+    areas = [dict(area, venues=list(area["venues"])) for area in _group_areas(rows)]
+    return areas, next_cursor
+
+
+def _detail_shows(owner_column, owner_id, columns, join_on, now, past_limit):
+    """Shows of one venue or artist for its detail page, from a single statement.
+
+    Returns (past_shows, upcoming_shows, past_cursor): all upcoming shows soonest first,
+    only the `past_limit` most recent past shows and the cursor to read older ones with
+    past_shows_page() (None when there are no more). The number of past shows is the
+    venue/artist past_shows_count counter.
+    """
+    if now is None:
+        now = datetime.now()
+    # one past show more than shown tells whether there are older ones
+    recent_past_ids = select(Show.id) \
+        .where(owner_column == owner_id, Show.start_time < now) \
+        .order_by(Show.start_time.desc(), Show.id.desc()) \
+        .limit(past_limit + 1)
+    rows = db.session.query(
+        Show.id,
+        *columns,
+        Show.start_time
+    ).join(*join_on) \
+     .filter(owner_column == owner_id) \
+     .filter(or_(Show.start_time > now, Show.id.in_(recent_past_ids))) \
+     .order_by(Show.start_time, Show.id) \
+     .all()
+
+    upcoming_shows = [row for row in rows if row.start_time > now]
+    past_shows = [row for row in reversed(rows) if row.start_time < now]
+    past_cursor = None
+    if len(past_shows) > past_limit:
+        past_shows = past_shows[:past_limit]
+        past_cursor = encode_cursor((past_shows[-1].start_time, past_shows[-1].id))
+    return past_shows, upcoming_shows, past_cursor
+
+
+def venue_shows(venue_id, now=None, past_limit=10):
+    """Shows of a venue with the artist columns the venue page shows, see _detail_shows()."""
+    return _detail_shows(Show.venue_id, venue_id, _VENUE_SHOW_COLUMNS,
+                         (Artist, Artist.id == Show.artist_id), now, past_limit)
+
+
+def artist_shows(artist_id, now=None, past_limit=10):
+    """Shows of an artist with the venue columns the artist page shows, see _detail_shows()."""
+    return _detail_shows(Show.artist_id, artist_id, _ARTIST_SHOW_COLUMNS,
+                         (Venue, Venue.id == Show.venue_id), now, past_limit)
+
+
+def past_shows_page(model, id, before=None, limit=10, now=None):
+    """Page of past shows of a venue or artist, most recent first, older than the `before` cursor.
+
+    Returns (rows, next_cursor) with the same columns as venue_shows()/artist_shows().
+    """
+    if now is None:
+        now = datetime.now()
+    if model is Venue:
+        owner_column, columns, join_on = Show.venue_id, _VENUE_SHOW_COLUMNS, (Artist, Artist.id == Show.artist_id)
+    else:
+        owner_column, columns, join_on = Show.artist_id, _ARTIST_SHOW_COLUMNS, (Venue, Venue.id == Show.venue_id)
+    query = db.session.query(Show.id, *columns, Show.start_time) \
+        .join(*join_on) \
+        .filter(owner_column == id) \
+        .filter(Show.start_time < now)
+    return keyset_page(query, (Show.start_time, Show.id),
+                       lambda row: (row.start_time, row.id),
+                       after=before, limit=limit, descending=True)
+
+
+def artists_page(after=None, limit=50):
+    query = db.session.query(Artist.id, Artist.name)
+    return keyset_page(query, (Artist.name, Artist.id),
+                       lambda row: (row.name, row.id),
+                       after=after, limit=limit)
+
+
+def show_listing(start_from=None, start_to=None, now=None, state=None, genre=None):
+    """Core select of the /shows listing: the columns pages/shows.html renders (and the id
+    completing the sort order) from one join, as plain rows.
+
+    Shows starting from `start_from` (included) until `start_to` (excluded); without
+    `start_from` only upcoming shows are listed. `state` keeps the shows at venues of that
+    state, `genre` the shows of artists playing that genre.
+    """
+    statement = select(
+        Show.id,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.start_time
+    ).join_from(Show, Venue, Venue.id == Show.venue_id) \
+     .join(Artist, Artist.id == Show.artist_id)
+    if start_from is not None:
+        statement = statement.where(Show.start_time >= start_from)
+    else:
+        statement = statement.where(Show.start_time > (now or datetime.now()))
+    if start_to is not None:
+        statement = statement.where(Show.start_time < start_to)
+    if state is not None:
+        statement = statement.where(Venue.state == state)
+    if genre is not None:
+        statement = statement.where(Show.artist_id.in_(
+            select(artist_genre_relation.c.artist_id)
+            .join(Genre, Genre.id == artist_genre_relation.c.genre_id)
+            .where(Genre.name == genre)
+        ))
+    return statement
+
+
+def shows_page(after=None, limit=50, **filters):
+    """Page of show_listing(**filters) ordered by start time."""
+    return keyset_page(show_listing(**filters), (Show.start_time, Show.id),
+                       lambda row: (row.start_time, row.id),
+                       after=after, limit=limit)
+
+
+#----------------------------------------------------------------------------#
+# Calendars.
+#----------------------------------------------------------------------------#
+
+# Number of shows per day over a date range, for month views. Counted in one GROUP BY
+# over a range scan of the (venue_id|artist_id, start_time) indexes, whatever the number
+# of venues/artists asked for.
+
+def show_calendar(owner_column, owner_ids, start, end):
+    """Returns {owner id: {'YYYY-MM-DD': number of shows}} for the shows of the given venues
+    (owner_column Show.venue_id) or artists (Show.artist_id) starting in [start, end).
+    Owners without shows in the range map to an empty dict."""
+    owner_ids = list(owner_ids)
+    calendar = {id: {} for id in owner_ids}
+    if not owner_ids:
+        return calendar
+    day = func.date(Show.start_time)
+    rows = db.session.query(owner_column, day, func.count(Show.id)) \
+        .filter(owner_column.in_(owner_ids), Show.start_time >= start, Show.start_time < end) \
+        .group_by(owner_column, day)
+    for owner_id, date, count in rows:
+        # a date on Postgres, 'YYYY-MM-DD' text on SQLite
+        calendar[owner_id][str(date)] = count
+    return calendar
+
+
+def area_venue_ids(city, state):
+    return [id for id, in db.session.query(Venue.id).filter(Venue.state == state, Venue.city == city)]
+
+
+#----------------------------------------------------------------------------#
+# Streaming.
+#----------------------------------------------------------------------------#
+
+# Unpaginated listings for streamed pages: rows are read through a server-side cursor
+# in batches of STREAM_BATCH_SIZE and handed out one by one, so memory stays bounded
+# whatever the number of rows.
+
+STREAM_BATCH_SIZE = 1000
+
+
+def stream_query(query):
+    """Reads `query` (ORM Query or Core select) through a server-side cursor,
+    STREAM_BATCH_SIZE rows at a time."""
+    if isinstance(query, Select):
+        result = db.session.execute(query.execution_options(stream_results=True))
+        return (row for rows in result.partitions(STREAM_BATCH_SIZE) for row in rows)
+    return query.execution_options(stream_results=True).yield_per(STREAM_BATCH_SIZE)
+
+
+def iter_venue_areas():
+    """Lazy version of venue_areas() over all venues, areas and their venues are generators."""
+    query = _venue_area_query().order_by(VenueAreaSummary.state, VenueAreaSummary.city, VenueAreaSummary.venue_id)
+    return _group_areas(stream_query(query))
+
+
+def iter_artists():
+    return stream_query(db.session.query(Artist.id, Artist.name).order_by(Artist.name, Artist.id))
+
+
+def iter_shows(**filters):
+    """All shows of show_listing(**filters) ordered by start time."""
+    statement = show_listing(**filters).order_by(Show.start_time, Show.id)
+    for row in stream_query(statement):
+        yield row._asdict()
+
+
+#----------------------------------------------------------------------------#
+# Page versions.
+#----------------------------------------------------------------------------#
+
+# The version of a page for its ETag: the counters of the pages it is made of (versions.py),
+# read by primary key. The writes changing a page bump them, the tables are never counted.
+
+def venues_version():
+    return page_versions('venues')
+
+
+def artists_version():
+    return page_versions('artists')
+
+
+def shows_version():
+    return page_versions('shows')
+
+
+def venue_version(venue_id):
+    return page_versions(f'venue:{venue_id}')
+
+
+def artist_version(artist_id):
+    return page_versions(f'artist:{artist_id}')
@@ -0,0 +1,175 @@
+import threading
+from abc import ABC, abstractmethod
+from flask import current_app
+from sqlalchemy import func
+from models import db
+from queries import upcoming_show_counts
+
+# Name search behind /venues/search and /artists/search.
+#
+# Two interchangeable backends:
+#  - TrigramSearch: Postgres, `name ILIKE '%term%'` served by the pg_trgm GIN indexes
+#    on Venue.name/Artist.name and ranked by trigram similarity.
+#  - NgramIndexSearch: an in-process trigram inverted index, for SQLite/testing where
+#    ILIKE is always a full scan. Built from the database on first use and kept up to
+#    date by the create/edit/delete handlers through index_document()/remove_document(),
+#    called after their commit: each web process has its own index.
+#
+# SEARCH_BACKEND in config.py picks one ('trigram', 'ngram'), 'auto' uses the database dialect.
+
+NGRAM_SIZE = 3
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+def _rank(name, term):
+    # exact match, then prefix, then start of a word, then anywhere; earlier and shorter is better
+    position = name.find(term)
+    if name == term:
+        kind = 0
+    elif position == 0:
+        kind = 1
+    elif name[position - 1] == ' ':
+        kind = 2
+    else:
+        kind = 3
+    return (kind, position, len(name))
+
+
+class SearchBackend(ABC):
+    @abstractmethod
+    def search(self, model, term, limit):
+        """Returns (total, results): the number of `model` rows whose name contains `term`
+        and up to `limit` of them as (id, name) pairs, best first."""
+
+    def index_document(self, model, id, name):
+        pass
+
+    def remove_document(self, model, id):
+        pass
+
+
+class TrigramSearch(SearchBackend):
+    def search(self, model, term, limit):
+        # escape LIKE wildcards typed by the user so they match literally
+        escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        # the number of matches comes with the rows (a window over the whole match set)
+        rows = db.session.query(model.id, model.name, func.count().over()) \
+            .filter(model.name.ilike('%' + escaped + '%', escape='\\')) \
+            .order_by(func.similarity(model.name, term).desc(), model.name, model.id) \
+            .limit(limit) \
+            .all()
+        return (rows[0][2] if rows else 0), [(id, name) for id, name, _ in rows]
+
+
+class NgramIndexSearch(SearchBackend):
+    def __init__(self):
+        self._lock = threading.Lock()
+        # per model: {id: lowercased name}, {ngram: set of ids}, {id: original name}
+        self._names = {}
+        self._postings = {}
+        self._display_names = {}
+
+    def _ensure_loaded(self, model):
+        if model in self._names:
+            return
+        rows = db.session.query(model.id, model.name).yield_per(1000)
+        with self._lock:
+            if model in self._names:
+                return
+            self._names[model] = {}
+            self._postings[model] = {}
+            self._display_names[model] = {}
+            for id, name in rows:
+                self._add(model, id, name)
+
+    def _add(self, model, id, name):
+        name = name or ''
+        lowered = name.lower()
+        self._names[model][id] = lowered
+        self._display_names[model][id] = name
+        postings = self._postings[model]
+        for gram in _ngrams(lowered):
+            postings.setdefault(gram, set()).add(id)
+
+    def _remove(self, model, id):
+        lowered = self._names[model].pop(id, None)
+        self._display_names[model].pop(id, None)
+        if lowered is None:
+            return
+        postings = self._postings[model]
+        for gram in _ngrams(lowered):
+            ids = postings.get(gram)
+            if ids is not None:
+                ids.discard(id)
+                if not ids:
+                    del postings[gram]
+
+    def search(self, model, term, limit):
+        self._ensure_loaded(model)
+        term = term.lower()
+        with self._lock:
+            names = self._names[model]
+            grams = _ngrams(term)
+            if grams:
+                # a name containing `term` contains every ngram of it, intersect the
+                # smallest posting lists first and verify the survivors
+                posting_lists = sorted((self._postings[model].get(gram, set()) for gram in grams), key=len)
+                candidates = set(posting_lists[0])
+                for ids in posting_lists[1:]:
+                    candidates &= ids
+                    if not candidates:
+                        break
+            else:
+                # terms shorter than an ngram can't use the index
+                candidates = names.keys()
+            matches = [(_rank(names[id], term), id) for id in candidates if term in names[id]]
+            matches.sort()
+            return len(matches), [(id, self._display_names[model][id]) for _, id in matches[:limit]]
+
+    def index_document(self, model, id, name):
+        with self._lock:
+            if model not in self._names:
+                # not loaded yet, the first search reads the row from the database
+                return
+            self._remove(model, id)
+            self._add(model, id, name)
+
+    def remove_document(self, model, id):
+        with self._lock:
+            if model in self._names:
+                self._remove(model, id)
+
+
+def get_search_backend():
+    backend = current_app.extensions.get('search')
+    if backend is None:
+        kind = current_app.config.get('SEARCH_BACKEND', 'auto')
+        if kind == 'auto':
+            kind = 'trigram' if db.engine.dialect.name == 'postgresql' else 'ngram'
+        backend = TrigramSearch() if kind == 'trigram' else NgramIndexSearch()
+        current_app.extensions['search'] = backend
+    return backend
+
+
+def search_catalog(model, term):
+    """Searches venues or artists by name, returns the structure the search templates expect:
+    {"count": ..., "data": [{"id", "name", "num_upcoming_shows"}]}
+    `count` is the number of matches, `data` only holds the SEARCH_MAX_RESULTS best ones.
+    """
+    limit = current_app.config.get('SEARCH_MAX_RESULTS', 50)
+    total, results = get_search_backend().search(model, term, limit)
+
+    # upcoming show counters of all hits in one primary key lookup
+    counts = upcoming_show_counts(model, [id for id, _ in results])
+    data = [{
+        "id": id,
+        "name": name,
+        "num_upcoming_shows": counts[id]
+    } for id, name in results]
+    return {
+        "count": total,
+        "data": data
+    }
@@ -0,0 +1,167 @@
+import json
+from datetime import date, datetime
+from models import db, Venue, Artist, Show, Genre, artist_genre_relation, venue_genre_relation
+from queries import keyset_page
+
+# Serializers for the JSON API (api.py).
+#
+# A serializer maps public field names to column expressions and reads only the columns
+# of the requested fields (`?fields=id,name`), as plain rows: no ORM objects are built and
+# nothing goes through the session's identity map. Pages use the same keyset pagination
+# as the HTML listings. JSON is encoded with orjson when it is installed.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(data):
+    """Compact JSON encoding of `data` (bytes with orjson, str otherwise), dates as ISO 8601."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, default=_default, separators=(',', ':'))
+
+
+class Serializer:
+    model = None
+    # public name -> column expression
+    fields = {}
+    # fields returned when the request doesn't ask for specific ones
+    default_fields = ()
+    # unique sort order of the listing, the last column must be the primary key
+    sort_columns = ()
+    # (target, onclause) pairs needed by the fields
+    joins = ()
+    # many-to-many genres table and its owner column, for the 'genres' field
+    genre_relation = None
+
+    def __init__(self, fields=None):
+        if fields is None:
+            fields = self.default_fields
+        available = set(self.fields)
+        if self.genre_relation is not None:
+            available.add('genres')
+        unknown = [field for field in fields if field not in available]
+        if unknown:
+            raise ValueError('Unknown fields: {}'.format(', '.join(unknown)))
+        self.selected = list(dict.fromkeys(fields))
+
+    def _query(self):
+        # the sort columns are always read (labelled apart) to build the next cursor
+        columns = [self.fields[name].label(name) for name in self.selected if name in self.fields]
+        columns += [column.label(f'_sort{i}') for i, column in enumerate(self.sort_columns)]
+        query = db.session.query(*columns).select_from(self.model)
+        for target, onclause in self.joins:
+            query = query.join(target, onclause)
+        return query
+
+    def _genres(self, ids):
+        # genres of all rows of a page in one query
+        relation, owner = self.genre_relation
+        genres = {id: [] for id in ids}
+        if ids:
+            rows = db.session.query(relation.c[owner], Genre.name) \
+                .join(Genre, Genre.id == relation.c.genre_id) \
+                .filter(relation.c[owner].in_(ids)) \
+                .order_by(Genre.name)
+            for id, name in rows:
+                genres[id].append(name)
+        return genres
+
+    def _serialize(self, rows):
+        data = [{name: row._mapping[name] for name in self.selected if name in self.fields} for row in rows]
+        if 'genres' in self.selected:
+            # the primary key is the last sort column
+            key = f'_sort{len(self.sort_columns) - 1}'
+            genres = self._genres([row._mapping[key] for row in rows])
+            for item, row in zip(data, rows):
+                item['genres'] = genres[row._mapping[key]]
+        return data
+
+    def page(self, after=None, limit=50, filters=()):
+        """Returns (items, next_cursor) for one page of the listing."""
+        query = self._query()
+        for criterion in filters:
+            query = query.filter(criterion)
+        sort_keys = [f'_sort{i}' for i in range(len(self.sort_columns))]
+        rows, next_cursor = keyset_page(query, self.sort_columns,
+                                        lambda row: [row._mapping[key] for key in sort_keys],
+                                        after=after, limit=limit)
+        return self._serialize(rows), next_cursor
+
+    def one(self, id):
+        row = self._query().filter(self.model.id == id).first()
+        if row is None:
+            return None
+        return self._serialize([row])[0]
+
+
+class VenueSerializer(Serializer):
+    model = Venue
+    fields = {
+        'id': Venue.id,
+        'name': Venue.name,
+        'city': Venue.city,
+        'state': Venue.state,
+        'address': Venue.address,
+        'phone': Venue.phone,
+        'website': Venue.website,
+        'facebook_link': Venue.facebook_link,
+        'image_link': Venue.image_link,
+        'seeking_talent': Venue.seeking_talent,
+        'seeking_description': Venue.seeking_description,
+        'updated_at': Venue.updated_at,
+        'num_upcoming_shows': Venue.upcoming_shows_count,
+        'past_shows_count': Venue.past_shows_count,
+    }
+    default_fields = ('id', 'name', 'city', 'state')
+    sort_columns = (Venue.state, Venue.city, Venue.id)
+    genre_relation = (venue_genre_relation, 'venue_id')
+
+
+class ArtistSerializer(Serializer):
+    model = Artist
+    fields = {
+        'id': Artist.id,
+        'name': Artist.name,
+        'city': Artist.city,
+        'state': Artist.state,
+        'phone': Artist.phone,
+        'website_link': Artist.website_link,
+        'facebook_link': Artist.facebook_link,
+        'image_link': Artist.image_link,
+        'seeking_venue': Artist.seeking_venue,
+        'seeking_description': Artist.seeking_description,
+        'updated_at': Artist.updated_at,
+        'num_upcoming_shows': Artist.upcoming_shows_count,
+        'past_shows_count': Artist.past_shows_count,
+    }
+    default_fields = ('id', 'name')
+    sort_columns = (Artist.name, Artist.id)
+    genre_relation = (artist_genre_relation, 'artist_id')
+
+
+class ShowSerializer(Serializer):
+    model = Show
+    fields = {
+        'id': Show.id,
+        'start_time': Show.start_time,
+        'end_time': Show.end_time,
+        'venue_id': Show.venue_id,
+        'venue_name': Venue.name,
+        'artist_id': Show.artist_id,
+        'artist_name': Artist.name,
+        'artist_image_link': Artist.image_link,
+    }
+    default_fields = ('id', 'start_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name', 'artist_image_link')
+    sort_columns = (Show.start_time, Show.id)
+    joins = (
+        (Venue, Venue.id == Show.venue_id),
+        (Artist, Artist.id == Show.artist_id),
+    )
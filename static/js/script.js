@@ -2,3 +2,27 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// "Older shows" button on venue/artist pages: replaces itself with the next page of past shows,
+// which ends with the button for the page after it (if any)
+document.addEventListener('click', function (e) {
+  var button = e.target.closest && e.target.closest('.load-past-shows');
+  if (!button) {
+    return;
+  }
+  e.preventDefault();
+  button.disabled = true;
+  fetch(button.getAttribute('data-url'))
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.statusText);
+      }
+      return response.text();
+    })
+    .then(function (html) {
+      button.closest('.past-shows-more').outerHTML = html;
+    })
+    .catch(function () {
+      button.disabled = false;
+    });
+});
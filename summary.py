@@ -0,0 +1,122 @@
+from datetime import datetime
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, func, literal, select, DateTime
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Venue, Show, VenueAreaSummary
+from cache import invalidate, area_tag
+from versions import bump_versions
+
+# Maintenance of venue_area_summary, the table /venues is read from.
+#
+# Each row holds a venue's area, name and number of upcoming shows, so the listing is an
+# index range scan instead of a join and GROUP BY over every show. Rows are recomputed per
+# venue by the handlers that change them (refresh_venues() in the same transaction as the
+# change) and, as time passes and shows become past shows, by `flask summary rollover`
+# run periodically (cron): it refreshes the venues whose next show has started.
+# Area totals are a GROUP BY over the (state, city) index of the table. Every refresh
+# bumps the version of /venues (versions.py) in its transaction.
+#
+# A plain table rather than a Postgres materialized view: REFRESH MATERIALIZED VIEW always
+# recomputes the whole view, where these rows are refreshed one venue at a time.
+
+_COLUMNS = ('venue_id', 'state', 'city', 'name', 'num_upcoming_shows', 'next_show_time', 'updated_at')
+
+
+def _summary_select(now):
+    # LEFT JOIN so venues without any show get a row with 0 upcoming shows
+    is_upcoming = Show.start_time > now
+    return select(
+        Venue.id,
+        Venue.state,
+        Venue.city,
+        Venue.name,
+        func.count(case((is_upcoming, Show.id))),
+        func.min(case((is_upcoming, Show.start_time))),
+        literal(datetime.utcnow(), DateTime),
+    ).select_from(Venue) \
+     .outerjoin(Show, Show.venue_id == Venue.id) \
+     .group_by(Venue.id)
+
+
+def _upsert(dialect_name, rows):
+    # insert the recomputed rows, replacing the existing ones
+    if dialect_name == 'postgresql':
+        insert = postgresql.insert(VenueAreaSummary)
+    elif dialect_name == 'sqlite':
+        insert = sqlite.insert(VenueAreaSummary)
+    else:
+        return None
+    insert = insert.from_select(_COLUMNS, rows)
+    return insert.on_conflict_do_update(
+        index_elements=['venue_id'],
+        set_={column: insert.excluded[column] for column in _COLUMNS[1:]}
+    )
+
+
+def refresh_venues(venue_ids, now=None):
+    """Recomputes the summary rows of `venue_ids` in the current transaction, dropping
+    the rows of venues that no longer exist."""
+    venue_ids = list(set(int(id) for id in venue_ids))
+    if not venue_ids:
+        return
+    if now is None:
+        now = datetime.now()
+    rows = _summary_select(now).where(Venue.id.in_(venue_ids))
+    upsert = _upsert(db.engine.dialect.name, rows)
+    if upsert is None:
+        db.session.execute(VenueAreaSummary.__table__.delete().where(VenueAreaSummary.venue_id.in_(venue_ids)))
+        upsert = VenueAreaSummary.__table__.insert().from_select(_COLUMNS, rows)
+    db.session.execute(upsert)
+    # deleted venues (the foreign key cascade only covers databases enforcing it)
+    db.session.execute(VenueAreaSummary.__table__.delete().where(
+        VenueAreaSummary.venue_id.in_(venue_ids),
+        ~VenueAreaSummary.venue_id.in_(select(Venue.id).where(Venue.id.in_(venue_ids)))
+    ))
+    bump_versions('venues')
+
+
+def rebuild(now=None):
+    """Recomputes the whole table in the current transaction."""
+    if now is None:
+        now = datetime.now()
+    db.session.execute(VenueAreaSummary.__table__.delete())
+    db.session.execute(VenueAreaSummary.__table__.insert().from_select(_COLUMNS, _summary_select(now)))
+    bump_versions('venues')
+
+
+def rollover(now=None, batch_size=500):
+    """Refreshes the venues whose next show has started since their row was computed,
+    committing every `batch_size` venues. Returns the number of venues refreshed."""
+    if now is None:
+        now = datetime.now()
+    refreshed = 0
+    while True:
+        rows = db.session.query(VenueAreaSummary.venue_id, VenueAreaSummary.city, VenueAreaSummary.state) \
+            .filter(VenueAreaSummary.next_show_time <= now) \
+            .limit(batch_size).all()
+        if not rows:
+            return refreshed
+        refresh_venues([row.venue_id for row in rows], now=now)
+        db.session.commit()
+        invalidate('venues', *{area_tag(row.city, row.state) for row in rows})
+        refreshed += len(rows)
+
+
+summary_cli = AppGroup('summary', help='Maintain the venue_area_summary table.')
+
+
+@summary_cli.command('rollover')
+@click.option('--batch-size', default=500, show_default=True, help='Venues refreshed per transaction.')
+def rollover_command(batch_size):
+    """Refresh the venues whose upcoming shows have started, run it periodically."""
+    click.echo(f'Refreshed {rollover(batch_size=batch_size)} venues')
+
+
+@summary_cli.command('rebuild')
+def rebuild_command():
+    """Recompute the whole table."""
+    rebuild()
+    db.session.commit()
+    invalidate('venues')
+    click.echo(f'Rebuilt the summary of {VenueAreaSummary.query.count()} venues')
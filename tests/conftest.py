@@ -0,0 +1,75 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+# configured from the environment when app.py is imported: a throwaway SQLite database,
+# no page cache (every request runs its queries) and no background job threads
+_db_dir = tempfile.mkdtemp(prefix='fyyur-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'fyyur.db')
+os.environ['CACHE_BACKEND'] = 'none'
+os.environ['JOB_WORKER_IN_PROCESS'] = '0'
+
+import pytest
+from sqlalchemy import event
+from app import app as flask_app
+from models import db, Venue, Artist, Show, Genre
+from counters import check
+from summary import rebuild
+
+
+@pytest.fixture
+def app():
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+    # the ngram search index and the genre ids are per app, read again from the next test's data
+    flask_app.extensions.pop('search', None)
+    flask_app.extensions.pop('genre_ids', None)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_statements(app):
+    """count_statements(fn) runs fn() and returns the number of SQL statements it issued."""
+    def count(fn):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            fn()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        return len(statements)
+    return count
+
+
+@pytest.fixture
+def seed(app):
+    """seed(venues, shows_per_venue) adds venues in a few areas with one artist per venue,
+    half of the shows in the past, and brings the summary table and counters up to date."""
+    def seed(venues, shows_per_venue=2):
+        now = datetime.now()
+        genre = Genre.query.filter_by(name='Jazz').first() or Genre(name='Jazz')
+        start = Venue.query.count()
+        for i in range(start, start + venues):
+            venue = Venue(name=f'Venue {i}', city=f'City {i % 4}', state='CA', address='1 Main St', genres=[genre])
+            artist = Artist(name=f'Artist {i}', city=f'City {i % 4}', state='CA', genres=[genre])
+            db.session.add_all([venue, artist])
+            db.session.flush()
+            for j in range(shows_per_venue):
+                days = j + 1 if j % 2 else -(j + 1)
+                db.session.add(Show(venue_id=venue.id, artist_id=artist.id, start_time=now + timedelta(days=days)))
+        db.session.commit()
+        rebuild()
+        db.session.commit()
+        check(fix=True)
+    return seed
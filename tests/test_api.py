@@ -0,0 +1,43 @@
+def _walk(client, url):
+    # every item of a listing, following the `next` links
+    items = []
+    while url:
+        body = client.get(url).get_json()
+        items += body['data']
+        url = body['next']
+    return items
+
+
+def test_listing_pages_follow_the_next_links(client, seed):
+    seed(7)
+    artists = _walk(client, '/api/v1/artists?limit=3')
+    assert artists == [{'id': i + 1, 'name': f'Artist {i}'} for i in range(7)]
+    venues = _walk(client, '/api/v1/venues?limit=2')
+    assert sorted(venue['id'] for venue in venues) == list(range(1, 8))
+    # both shows of each venue
+    assert len(_walk(client, '/api/v1/shows?limit=5')) == 14
+
+
+def test_fields_choose_the_columns_returned(client, seed):
+    seed(2)
+    body = client.get('/api/v1/venues/2?fields=name,genres,num_upcoming_shows').get_json()
+    assert body == {'data': {'name': 'Venue 1', 'genres': ['Jazz'], 'num_upcoming_shows': 1}}
+    shows = client.get('/api/v1/shows?fields=venue_name,artist_name&limit=1').get_json()['data']
+    assert shows == [{'venue_name': 'Venue 0', 'artist_name': 'Artist 0'}]
+
+
+def test_errors_are_json(client, seed):
+    seed(1)
+    assert client.get('/api/v1/artists/99').get_json() == {'error': 'Not found'}
+    response = client.get('/api/v1/artists?fields=name,password')
+    assert (response.status_code, response.get_json()) == (400, {'error': 'Unknown fields: password'})
+    assert client.get('/api/v1/artists?after=nonsense').status_code == 400
+    assert client.get('/api/v1/search?type=shows').status_code == 400
+
+
+def test_search_returns_the_count_and_best_matches(client, seed):
+    seed(12)
+    body = client.get('/api/v1/search?type=artists&q=artist 1').get_json()
+    # Artist 1, 10, 11
+    assert body['count'] == 3
+    assert body['data'][0]['name'] == 'Artist 1'
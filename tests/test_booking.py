@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.exc import IntegrityError
+from booking import check_bookings, describe_conflict, Schedule, MAX_BOOKINGS
+from models import db, Show, MAX_SHOW_DURATION
+
+
+def test_shows_longer_than_the_maximum_duration_are_rejected(app, seed):
+    seed(1, shows_per_venue=0)
+    start = datetime(2030, 1, 1, 20)
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=start, end_time=start + MAX_SHOW_DURATION))
+    db.session.commit()
+    start += timedelta(days=7)
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=start, end_time=start + MAX_SHOW_DURATION + timedelta(seconds=1)))
+    with pytest.raises(IntegrityError, match='ck_Show_max_duration'):
+        db.session.commit()
+
+
+def _booking(venue_id, artist_id, start, hours=2):
+    return venue_id, artist_id, start, start + timedelta(hours=hours)
+
+
+def test_overlapping_a_stored_show_is_rejected_back_to_back_is_not(app, seed):
+    seed(2, shows_per_venue=0)
+    start = datetime(2030, 1, 1, 20)
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=start, end_time=start + timedelta(hours=2)))
+    db.session.commit()
+    show_id = Show.query.one().id
+    results = check_bookings([
+        _booking(1, 2, start + timedelta(hours=1)),     # same venue, overlaps
+        _booking(2, 1, start - timedelta(hours=1)),     # same artist, overlaps its start
+        _booking(1, 2, start + timedelta(hours=2)),     # right after it
+        _booking(2, 1, start - timedelta(hours=2)),     # right before it
+    ])
+    assert [[(c['on'], c.get('show_id')) for c in conflicts] for conflicts in results] == \
+        [[('venue', show_id)], [('artist', show_id)], [], []]
+
+
+def test_bookings_of_a_batch_conflict_with_each_other(app, seed):
+    seed(2, shows_per_venue=0)
+    start = datetime(2030, 1, 1, 20)
+    results = check_bookings([
+        _booking(1, 1, start + timedelta(hours=4)),
+        _booking(2, 1, start),                          # earlier, checked after: inserted before the first
+        _booking(1, 2, start + timedelta(hours=5)),     # overlaps booking 0 at the venue
+        _booking(2, 2, start + timedelta(hours=1)),     # overlaps booking 1 at the venue
+        _booking(2, 2, start + timedelta(hours=2)),     # back to back with booking 1
+    ])
+    assert [[(c['on'], c.get('booking')) for c in conflicts] for conflicts in results] == \
+        [[], [], [('venue', 0)], [('venue', 1)], []]
+    assert describe_conflict(results[2][0]) == 'the venue already has the show of row 1 from 2030-01-02 00:00 to 2030-01-02 02:00'
+
+
+def test_rejected_bookings_do_not_block_later_ones(app, seed):
+    seed(2, shows_per_venue=0)
+    start = datetime(2030, 1, 1, 20)
+    results = check_bookings([
+        _booking(1, 1, start),
+        _booking(1, 2, start + timedelta(hours=1)),     # rejected, overlaps booking 0
+        _booking(2, 2, start + timedelta(hours=1)),     # artist 2 is free: booking 1 wasn't made
+    ])
+    assert [len(conflicts) for conflicts in results] == [0, 1, 0]
+
+
+def test_schedule_keeps_shows_sorted_whatever_the_order_added():
+    schedule = Schedule()
+    start = datetime(2030, 1, 1)
+    for hours in (10, 0, 20, 5, 15):
+        schedule.add(1, start + timedelta(hours=hours), start + timedelta(hours=hours + 2), hours)
+    assert [ref for _, _, ref in schedule.overlapping(1, start, start + timedelta(days=1))] == [0, 5, 10, 15, 20]
+    assert [ref for _, _, ref in schedule.overlapping(1, start + timedelta(hours=6), start + timedelta(hours=11))] == [5, 10]
+
+
+def test_too_many_bookings_at_once_are_refused(app):
+    start = datetime(2030, 1, 1)
+    with pytest.raises(ValueError):
+        check_bookings([_booking(1, 1, start + timedelta(days=i)) for i in range(MAX_BOOKINGS + 1)])
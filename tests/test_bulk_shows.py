@@ -0,0 +1,52 @@
+import re
+from models import db, Show
+
+
+def _row(artist_id, venue_id, start_time, duration=120):
+    return {'artist_id': str(artist_id), 'venue_id': str(venue_id), 'start_time': start_time, 'duration': duration}
+
+
+def test_json_upload_gets_a_result_per_row(client, seed):
+    seed(2, shows_per_venue=0)
+    response = client.post('/shows/bulk', json={'shows': [
+        _row(1, 1, '2030-01-01 20:00:00'),
+        _row(99, 1, '2030-01-02 20:00:00'),            # unknown artist
+        _row(2, 1, '2030-01-01 21:00:00'),             # overlaps row 1 at the venue
+        _row(2, 2, 'not a date'),
+        _row(2, 2, '2030-01-01 22:00:00'),             # right after row 1, another venue
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['created'], body['rejected']) == (2, 3)
+    results = body['results']
+    assert [result['row'] for result in results] == [1, 2, 3, 4, 5]
+    ids = {show.id: (show.artist_id, show.venue_id) for show in Show.query}
+    assert ids[results[0]['id']] == (1, 1) and ids[results[4]['id']] == (2, 2)
+    assert results[1]['errors'] == {'artist_id': ['Unknown artist']}
+    assert results[2]['errors']['start_time'] == \
+        ['the venue already has the show of row 1 from 2030-01-01 20:00 to 2030-01-01 22:00']
+    assert 'start_time' in results[3]['errors']
+
+
+def test_json_upload_over_the_row_limit_is_refused(app, client, seed):
+    seed(1, shows_per_venue=0)
+    rows = [_row(1, 1, f'2030-01-{day:02d} 20:00:00') for day in range(1, 4)]
+    app.config['BULK_SHOWS_MAX_ROWS'] = 2
+    try:
+        response = client.post('/shows/bulk', json=rows)
+    finally:
+        app.config['BULK_SHOWS_MAX_ROWS'] = 500
+    assert response.status_code == 400
+    assert db.session.query(Show.id).count() == 0
+
+
+def test_form_upload_creates_the_valid_lines(app, client, seed):
+    seed(1, shows_per_venue=0)
+    # the form template renders the CSRF token
+    app.config['WTF_CSRF_ENABLED'] = True
+    token = re.search(rb'name="csrf_token" type="hidden" value="([^"]+)"', client.get('/shows/bulk').data).group(1)
+    lines = '1,1,2030-01-01 20:00:00,60\n1,1,2030-01-01 20:30:00,60\n1,1,2030-01-02 20:00:00\n'
+    response = client.post('/shows/bulk', data={'shows': lines, 'csrf_token': token.decode()})
+    assert response.status_code == 200
+    assert b'2 shows created, 1 rejected' in response.data
+    assert sorted(str(show.start_time) for show in Show.query) == ['2030-01-01 20:00:00', '2030-01-02 20:00:00']
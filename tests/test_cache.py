@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+import pytest
+from cache import LRUCache
+from jobs import Worker
+
+
+@pytest.fixture
+def cache(app):
+    """The in-process page cache, instead of the NullCache of the tests."""
+    cache = app.extensions['cache'] = LRUCache()
+    yield cache
+    app.extensions.pop('cache')
+
+
+def _run_jobs(app):
+    worker = Worker(app, threads=1)
+    worker.run(once=True)
+    worker.stop()
+
+
+def test_lru_cache_drops_the_entries_of_a_tag_only():
+    cache = LRUCache()
+    cache.set('a', 'A', 60, tags=('venues', 'venue:1'))
+    cache.set('b', 'B', 60, tags=('venue:2',))
+    cache.invalidate(['venue:1'])
+    assert (cache.get('a'), cache.get('b')) == (None, 'B')
+
+
+def test_lru_cache_evicts_the_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set('a', 'A', 60)
+    cache.set('b', 'B', 60)
+    cache.get('a')
+    cache.set('c', 'C', 60)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == ('A', None, 'C')
+
+
+def test_pages_are_served_from_the_cache(client, seed, cache, count_statements):
+    seed(2)
+    first = client.get('/artists/1').data
+    responses = []
+    # the version of the page, not its data
+    assert count_statements(lambda: responses.append(client.get('/artists/1'))) == 1
+    assert responses[0].data == first
+    assert cache.hits == 1
+
+
+def test_new_show_is_on_its_pages_right_away(client, seed, cache):
+    seed(3)
+    # cached before the show is added
+    assert b'Artist 0' not in client.get('/venues/2').data
+    assert b'Venue 1' not in client.get('/artists/1').data
+    assert client.get('/shows').data.count(b'Artist 0') == 1
+    start = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+    client.post('/shows/create', data={'artist_id': '1', 'venue_id': '2', 'start_time': start, 'duration': '60'})
+    assert b'Artist 0' in client.get('/venues/2').data
+    assert b'Venue 1' in client.get('/artists/1').data
+    assert client.get('/shows').data.count(b'Artist 0') == 2
+
+
+def test_edited_venue_name_is_on_the_pages_of_its_artists(client, seed, cache):
+    seed(2)
+    assert b'Venue 0' in client.get('/artists/1').data
+    client.post('/venues/1/edit', data={
+        'name': 'Renamed', 'city': 'City 0', 'state': 'CA', 'address': '1 Main St', 'phone': '',
+        'genres': ['Jazz'], 'seeking_description': '', 'image_link': '', 'website': '', 'facebook_link': ''})
+    _run_jobs(client.application)
+    page = client.get('/artists/1').data
+    assert b'Renamed' in page and b'Venue 0' not in page
+    assert b'Renamed' in client.get('/venues').data
+
+
+def test_deleted_venue_leaves_the_listing(client, seed, cache):
+    seed(3, shows_per_venue=0)
+    assert b'Venue 2' in client.get('/venues').data
+    assert client.delete('/venues/3').get_json() == {'success': True}
+    # the summary row is dropped by the refresh job
+    _run_jobs(client.application)
+    assert b'Venue 2' not in client.get('/venues').data
+    assert client.get('/venues/3').status_code == 404
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from models import db, Show
+from queries import show_calendar
+
+
+def _shows(*bookings):
+    # (venue id, artist id, 'YYYY-MM-DD HH:MM') each, two hours long
+    for venue_id, artist_id, start in bookings:
+        start = datetime.strptime(start, '%Y-%m-%d %H:%M')
+        db.session.add(Show(venue_id=venue_id, artist_id=artist_id, start_time=start,
+                            end_time=start + timedelta(hours=2)))
+    db.session.commit()
+
+
+def test_show_calendar_counts_the_shows_of_each_day(app, seed):
+    seed(3, shows_per_venue=0)
+    _shows((1, 1, '2030-03-01 18:00'), (1, 2, '2030-03-01 21:00'), (1, 1, '2030-03-31 23:00'),
+           (2, 2, '2030-03-15 20:00'), (1, 1, '2030-04-01 00:00'), (2, 1, '2030-02-28 23:00'))
+    calendar = show_calendar(Show.venue_id, [1, 2, 3], datetime(2030, 3, 1), datetime(2030, 4, 1))
+    assert calendar == {1: {'2030-03-01': 2, '2030-03-31': 1}, 2: {'2030-03-15': 1}, 3: {}}
+    calendar = show_calendar(Show.artist_id, [1, 2], datetime(2030, 3, 1), datetime(2030, 4, 1))
+    assert calendar == {1: {'2030-03-01': 1, '2030-03-31': 1}, 2: {'2030-03-01': 1, '2030-03-15': 1}}
+    assert show_calendar(Show.venue_id, [], datetime(2030, 3, 1), datetime(2030, 4, 1)) == {}
+
+
+def test_venue_and_artist_calendars(client, seed):
+    seed(2, shows_per_venue=0)
+    _shows((1, 1, '2030-12-24 20:00'), (1, 2, '2030-12-24 22:30'), (2, 1, '2030-12-31 21:00'))
+    body = client.get('/venues/1/calendar?month=2030-12').get_json()
+    assert body == {'venue_id': 1, 'month': '2030-12', 'days': {'2030-12-24': 2}, 'total': 2}
+    body = client.get('/artists/1/calendar?month=2030-12').get_json()
+    assert body == {'artist_id': 1, 'month': '2030-12', 'days': {'2030-12-24': 1, '2030-12-31': 1}, 'total': 2}
+    assert client.get('/artists/1/calendar?month=2031-01').get_json()['days'] == {}
+    assert client.get('/venues/9/calendar').status_code == 404
+    assert client.get('/venues/1/calendar?month=December').status_code == 400
+
+
+def test_area_calendar_has_every_venue_of_the_area(client, seed):
+    # venues 1 and 5 in City 0, venue 2 in City 1
+    seed(5, shows_per_venue=0)
+    _shows((1, 1, '2030-06-10 20:00'), (2, 2, '2030-06-10 20:00'), (1, 5, '2030-07-01 20:00'))
+    body = client.get('/venues/calendar', query_string={'city': 'City 0', 'state': 'CA', 'month': '2030-06'}).get_json()
+    assert body == {'city': 'City 0', 'state': 'CA', 'month': '2030-06',
+                    'venues': {'1': {'2030-06-10': 1}, '5': {}}}
+    assert client.get('/venues/calendar', query_string={'city': 'City 0'}).status_code == 400
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+from counters import rollover
+from models import db, PageVersion
+
+
+def _etag(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    return response.headers['ETag']
+
+
+def test_matching_etag_gets_304_from_one_statement(client, seed, count_statements):
+    seed(2)
+    etag = _etag(client, '/artists/1')
+    responses = []
+    statements = count_statements(lambda: responses.append(client.get('/artists/1', headers={'If-None-Match': etag})))
+    assert responses[0].status_code == 304
+    assert responses[0].data == b''
+    # the version row, not the page data
+    assert statements == 1
+
+
+def test_new_show_changes_the_etags_of_its_pages(client, seed):
+    seed(3)
+    paths = ['/shows', '/venues/2', '/artists/1', '/artists/3', '/venues']
+    before = {path: _etag(client, path) for path in paths}
+    start = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+    response = client.post('/shows/create', data={'artist_id': '1', 'venue_id': '2', 'start_time': start, 'duration': '60'})
+    assert response.status_code == 200
+    after = {path: _etag(client, path) for path in paths}
+    assert [path for path in paths if before[path] != after[path]] == ['/shows', '/venues/2', '/artists/1']
+
+
+def test_artist_edit_changes_the_pages_of_its_venues(client, seed):
+    seed(2)
+    before = _etag(client, '/venues/1')
+    response = client.post('/artists/1/edit', data={
+        'name': 'Renamed', 'city': 'City 1', 'state': 'CA', 'genres': ['Jazz'], 'phone': '',
+        'seeking_description': '', 'image_link': '', 'website_link': '', 'facebook_link': ''},
+        follow_redirects=True)
+    # the flashed message is rendered into the artist page, the next pages get an ETag
+    assert response.status_code == 200
+    assert _etag(client, '/venues/1') != before
+    assert b'Renamed' in client.get('/venues/1').data
+
+
+def test_rollover_changes_the_etags_of_the_started_shows_pages(client, seed):
+    seed(2)
+    before = {path: _etag(client, path) for path in ('/shows', '/venues/1', '/venues/2')}
+    # seed() puts every venue's upcoming show 2 days ahead
+    assert rollover(now=datetime.now() + timedelta(days=3)) == 2
+    assert all(_etag(client, path) != etag for path, etag in before.items())
+    assert db.session.get(PageVersion, 'shows').version >= 1
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+from counters import check, rollover, shows_added
+from models import db, Venue, Artist, Show
+
+
+def _counters(model):
+    return [(row.id, row.upcoming_shows_count, row.past_shows_count) for row in model.query.order_by(model.id)]
+
+
+def test_shows_added_counts_upcoming_and_past(app, seed):
+    seed(2, shows_per_venue=0)
+    shows_added([(1, 2, False), (1, 2, True), (1, 1, False)])
+    assert _counters(Venue) == [(1, 2, 1), (2, 0, 0)]
+    assert _counters(Artist) == [(1, 1, 0), (2, 1, 1)]
+
+
+def test_rollover_moves_started_shows_to_past(app, seed):
+    seed(2, shows_per_venue=4)
+    # per venue: shows 1 and 3 days ago, 2 and 4 days ahead
+    assert _counters(Venue) == [(1, 2, 2), (2, 2, 2)]
+    assert rollover(now=datetime.now() + timedelta(days=3), batch_size=1) == 2
+    assert _counters(Venue) == [(1, 1, 3), (2, 1, 3)]
+    assert _counters(Artist) == [(1, 1, 3), (2, 1, 3)]
+    assert Show.query.filter_by(is_past=True).count() == 6
+    # already moved shows aren't counted twice
+    assert rollover(now=datetime.now() + timedelta(days=3)) == 0
+    assert check() == {'venues': [], 'artists': []}
+
+
+def test_check_reports_and_fixes_drift(app, seed):
+    seed(3)
+    db.session.execute(Venue.__table__.update().where(Venue.id == 2).values(upcoming_shows_count=7))
+    db.session.execute(Artist.__table__.update().where(Artist.id == 3).values(past_shows_count=0))
+    db.session.commit()
+    drift = check()
+    # (id, stored upcoming, actual upcoming, stored past, actual past)
+    assert drift == {'venues': [(2, 7, 1, 1, 1)], 'artists': [(3, 1, 1, 0, 1)]}
+    # reporting only changes nothing
+    assert check() == drift
+    check(fix=True)
+    assert check() == {'venues': [], 'artists': []}
+    assert _counters(Venue)[1] == (2, 1, 1)
+
+
+def test_check_command_fixes_drift(app, seed):
+    seed(2)
+    db.session.execute(Venue.__table__.update().values(past_shows_count=5))
+    db.session.commit()
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['counters', 'check'])
+    assert 'venues 1: upcoming 1 (actual 1), past 5 (actual 1)' in result.output
+    result = runner.invoke(args=['counters', 'check', '--fix'])
+    assert result.exit_code == 0
+    db.session.expire_all()
+    assert _counters(Venue) == [(1, 1, 1), (2, 1, 1)]
@@ -0,0 +1,32 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+from exporter import EXPORTS, export_chunks
+
+
+def _export(kind, format, **filters):
+    return b''.join(export_chunks(kind, format=format, **filters)).decode()
+
+
+@pytest.mark.parametrize('kind', EXPORTS)
+def test_csv_and_jsonl_exports_have_the_same_rows(app, seed, kind):
+    seed(3)
+    rows = list(csv.DictReader(io.StringIO(_export(kind, 'csv'))))
+    lines = [json.loads(line) for line in _export(kind, 'jsonl').splitlines()]
+    assert len(rows) == len(lines) > 0
+    assert [list(row) for row in rows] == [list(line) for line in lines]
+    key = next(iter(rows[0]))
+    assert [row[key] for row in rows] == [str(line[key]) for line in lines]
+
+
+def test_export_filters_and_gzip(client, seed):
+    seed(4)
+    response = client.get('/api/v1/export?type=venue_genres&format=jsonl', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    lines = gzip.decompress(response.data).decode().splitlines()
+    assert [json.loads(line)['genre'] for line in lines] == ['Jazz'] * 4
+    assert _export('venues', 'jsonl', state='NY') == ''
+    shows = [json.loads(line) for line in _export('shows', 'jsonl').splitlines()]
+    assert len(shows) == 8
@@ -0,0 +1,29 @@
+import os
+from flask import Flask
+from models import db, Genre
+from genres import resolve_genres
+
+
+def test_resolve_genres_creates_missing_ones_once(app):
+    db.session.add(Genre(name='Jazz'))
+    db.session.commit()
+    genres = resolve_genres(['Jazz', 'Folk', 'Jazz', ''])
+    db.session.commit()
+    assert [genre.name for genre in genres] == ['Jazz', 'Folk']
+    assert sorted(name for name, in db.session.query(Genre.name)) == ['Folk', 'Jazz']
+
+
+def test_genre_ids_are_cached_per_app(app, tmp_path):
+    other = Flask('other')
+    other.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(tmp_path, 'other.db'),
+                        SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(other)
+    with other.app_context():
+        db.create_all()
+        db.session.add_all([Genre(name='Folk'), Genre(name='Rock')])
+        db.session.commit()
+        assert resolve_genres(['Rock'])[0].id == 2
+        db.session.remove()
+    db.session.add(Genre(name='Rock'))
+    db.session.commit()
+    assert resolve_genres(['Rock'])[0].id == 1
@@ -0,0 +1,90 @@
+import csv
+import io
+import json
+import pytest
+from exporter import export_chunks
+from importer import import_rows, read_rows
+from models import db
+
+IGNORED = {'updated_at'}
+
+
+def _export(kind, format):
+    return b''.join(export_chunks(kind, format=format)).decode()
+
+
+def _rows(kind, format):
+    # exported rows as the importer reads them, times to the second like the forms read them
+    rows = [row for _, row in read_rows(io.StringIO(_export(kind, format)), format)]
+    for row in rows:
+        for name in IGNORED:
+            row.pop(name, None)
+        for name in ('start_time', 'end_time'):
+            if name in row:
+                row[name] = row[name][:19]
+    return rows
+
+
+def _with_genres(kind, format, owner):
+    # genres are exported apart, one row per (owner, genre)
+    genres = {}
+    for _, row in read_rows(io.StringIO(_export(f'{kind[:-1]}_genres', format)), format):
+        genres.setdefault(str(row[owner]), []).append(row['genre'])
+    rows = [row for _, row in read_rows(io.StringIO(_export(kind, format)), format)]
+    for row in rows:
+        row['genres'] = genres.get(str(row['id']), [])
+    return rows
+
+
+@pytest.mark.parametrize('format', ['csv', 'jsonl'])
+def test_export_imports_back_to_the_same_catalog(app, seed, format):
+    seed(5)
+    # the forms require a facebook link, the importer stores phone numbers as digits
+    for table in ('Venue', 'Artist'):
+        db.session.execute(db.text(f'UPDATE "{table}" SET facebook_link = \'https://facebook.com/\' || id, '
+                                   f'phone = \'555123\' || id'))
+    # a venue looking for talent, checked after the round trip
+    db.session.execute(db.text('UPDATE "Venue" SET seeking_talent = 1 WHERE id = 2'))
+    db.session.commit()
+    before = {kind: _rows(kind, format) for kind in ('venues', 'artists', 'shows', 'venue_genres', 'artist_genres')}
+    files = {
+        'venues': _with_genres('venues', format, 'venue_id'),
+        'artists': _with_genres('artists', format, 'artist_id'),
+        'shows': [row for _, row in read_rows(io.StringIO(_export('shows', format)), format)],
+    }
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    for kind in ('venues', 'artists', 'shows'):
+        rejected = []
+        imported, _ = import_rows(kind, enumerate(files[kind], start=1),
+                                  on_reject=lambda line_num, errors: rejected.append((line_num, errors)))
+        assert rejected == []
+        assert imported == len(files[kind])
+    after = {kind: _rows(kind, format) for kind in before}
+    assert after == before
+    assert [row['seeking_talent'] for row in after['venues']].count('True' if format == 'csv' else True) == 1
+
+
+def test_rejected_rows_are_reported_with_their_line(app, seed):
+    seed(1, shows_per_venue=0)
+    lines = [
+        {'artist_id': 1, 'venue_id': 1, 'start_time': '2030-01-01T20:00:00', 'end_time': '2030-01-01T23:00:00'},
+        {'artist_id': 1, 'venue_id': 1, 'start_time': '2030-01-01T21:00:00'},
+        {'artist_id': 1, 'venue_id': 1, 'start_time': '2030-01-02T20:00:00', 'end_time': 'soon'},
+    ]
+    stream = io.StringIO(''.join(json.dumps(line) + '\n' for line in lines))
+    rejected = {}
+    imported, count = import_rows('shows', read_rows(stream, 'jsonl'),
+                                  on_reject=lambda line_num, errors: rejected.update({line_num: errors}))
+    assert (imported, count) == (1, 2)
+    assert list(rejected[2]) == ['start_time'] and list(rejected[3]) == ['duration']
+    assert _rows('shows', 'csv')[0]['end_time'] == '2030-01-01T23:00:00'
+
+
+def test_csv_booleans_are_read_as_exported(app):
+    stream = io.StringIO('name,city,state,phone,genres,facebook_link,seeking_venue\n'
+                         'A,City,CA,,Jazz,https://facebook.com/a,False\n'
+                         'B,City,CA,,Jazz,https://facebook.com/b,True\n')
+    assert import_rows('artists', read_rows(stream, 'csv')) == (2, 0)
+    assert [row['seeking_venue'] for row in csv.DictReader(io.StringIO(_export('artists', 'csv')))] == ['False', 'True']
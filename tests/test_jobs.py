@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+import pytest
+from jobs import HANDLERS, Worker, backoff, enqueue, job
+from models import db, Job, Artist
+from search import search_catalog
+
+
+@pytest.fixture
+def failing_job(app):
+    """A job failing `failures[0]` times before it succeeds."""
+    failures = [0]
+    runs = []
+
+    @job('flaky')
+    def flaky(n):
+        runs.append(n)
+        if len(runs) <= failures[0]:
+            raise RuntimeError('flaky failed')
+    settings = {'JOB_MAX_ATTEMPTS': 3, 'JOB_BACKOFF_SECONDS': 10, 'JOB_BACKOFF_MAX_SECONDS': 15}
+    saved = {name: app.config.get(name) for name in settings}
+    app.config.update(settings)
+    yield failures, runs
+    HANDLERS.pop('flaky')
+    app.config.update(saved)
+
+
+def _run_due(app):
+    # makes the queued jobs due and runs them once
+    db.session.execute(Job.__table__.update().values(run_at=datetime.utcnow()))
+    db.session.commit()
+    worker = Worker(app, threads=1)
+    worker.run(once=True)
+    worker.stop()
+    db.session.expire_all()
+
+
+def test_backoff_doubles_up_to_the_maximum():
+    for attempts, full in ((1, 2), (2, 4), (3, 8), (10, 60)):
+        assert full / 2 <= backoff(attempts, 2, 60) <= full
+
+
+def test_failed_job_is_retried_later_then_given_up(app, failing_job):
+    failures, runs = failing_job
+    failures[0] = 10
+    enqueue('flaky', n=1)
+    db.session.commit()
+
+    _run_due(app)
+    queued = Job.query.one()
+    assert (queued.attempts, queued.failed_at) == (1, None)
+    assert 'flaky failed' in queued.last_error
+    # first retry between 5 and 10 seconds later
+    assert timedelta(seconds=4) < queued.run_at - datetime.utcnow() <= timedelta(seconds=10)
+
+    _run_due(app)
+    queued = Job.query.one()
+    # second retry: backoff doubled, capped at JOB_BACKOFF_MAX_SECONDS
+    assert timedelta(seconds=7) < queued.run_at - datetime.utcnow() <= timedelta(seconds=15)
+
+    _run_due(app)
+    queued = Job.query.one()
+    assert queued.attempts == 3
+    assert queued.failed_at is not None
+    # given up: never claimed again
+    _run_due(app)
+    assert len(runs) == 3
+
+
+def test_job_that_succeeds_on_retry_is_removed(app, failing_job):
+    failures, runs = failing_job
+    failures[0] = 1
+    enqueue('flaky', n=2)
+    db.session.commit()
+    _run_due(app)
+    _run_due(app)
+    assert runs == [2, 2]
+    assert Job.query.count() == 0
+
+
+def test_job_of_a_rolled_back_transaction_never_runs(app, failing_job):
+    enqueue('flaky', n=3)
+    db.session.rollback()
+    assert Job.query.count() == 0
+
+
+def test_edited_artist_is_found_by_the_editing_process_without_a_job(client, seed):
+    seed(2)
+    # builds the ngram index of this process
+    assert search_catalog(Artist, 'renamed')['count'] == 0
+    client.post('/artists/1/edit', data={
+        'name': 'Renamed', 'city': 'City 1', 'state': 'CA', 'genres': ['Jazz'], 'phone': '',
+        'seeking_description': '', 'image_link': '', 'website_link': '', 'facebook_link': ''})
+    assert Job.query.count() == 0
+    assert search_catalog(Artist, 'renamed')['data'][0]['id'] == 1
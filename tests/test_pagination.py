@@ -0,0 +1,27 @@
+from queries import artists_page, venue_areas, encode_cursor, decode_cursor
+
+
+def _walk(page, limit):
+    # all the rows of a listing, following the cursors page by page
+    rows, cursor = page(after=None, limit=limit)
+    while cursor is not None:
+        more, cursor = page(after=decode_cursor(cursor), limit=limit)
+        rows += more
+    return rows
+
+
+def test_artist_pages_list_every_artist_once(app, seed):
+    seed(7)
+    rows = _walk(artists_page, 3)
+    assert [row.name for row in rows] == sorted(f'Artist {i}' for i in range(7))
+
+
+def test_venue_pages_list_every_venue_once(app, seed):
+    seed(9)
+    areas = _walk(venue_areas, 2)
+    assert sorted(venue['id'] for area in areas for venue in area['venues']) == list(range(1, 10))
+
+
+def test_cursor_with_a_null_sort_key_is_rejected(client, seed):
+    seed(3)
+    assert client.get('/artists', query_string={'after': encode_cursor([None, 1])}).status_code == 400
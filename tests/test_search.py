@@ -0,0 +1,27 @@
+import pytest
+from models import Venue
+from search import SearchBackend, search_catalog
+
+
+def test_count_is_the_number_of_matches_not_of_results_shown(app, seed):
+    seed(8)
+    app.config['SEARCH_MAX_RESULTS'] = 5
+    try:
+        results = search_catalog(Venue, 'venue')
+    finally:
+        app.config['SEARCH_MAX_RESULTS'] = 50
+    assert results['count'] == 8
+    assert len(results['data']) == 5
+
+
+def test_search_page_shows_the_total(client, seed):
+    seed(3)
+    page = client.post('/venues/search', data={'search_term': 'venue 1'}).get_data(as_text=True)
+    assert 'Number of search results for "venue 1": 1<' in page
+
+
+def test_backend_without_search_cannot_be_created():
+    class Incomplete(SearchBackend):
+        pass
+    with pytest.raises(TypeError):
+        Incomplete()
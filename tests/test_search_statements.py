@@ -0,0 +1,27 @@
+from queries import upcoming_show_counts
+from models import Venue
+
+
+def test_upcoming_show_counts_is_one_statement(app, seed, count_statements):
+    seed(30)
+    ids = [id for id, in Venue.query.with_entities(Venue.id)]
+    assert count_statements(lambda: upcoming_show_counts(Venue, ids[:1])) == 1
+    assert count_statements(lambda: upcoming_show_counts(Venue, ids)) == 1
+
+
+def _search(app, client):
+    # the first search loads the ngram index (SQLite) from the venues seeded so far,
+    # keep that out of the counts
+    app.extensions.pop('search', None)
+    client.post('/venues/search', data={'search_term': 'venue'})
+    return lambda: client.post('/venues/search', data={'search_term': 'venue'})
+
+
+def test_search_statements_do_not_grow_with_results(app, client, seed, count_statements):
+    seed(3)
+    small = count_statements(_search(app, client))
+    seed(40)
+    search = _search(app, client)
+    large = count_statements(search)
+    assert search().get_data(as_text=True).count('Venue 42') == 1
+    assert small == large
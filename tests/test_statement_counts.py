@@ -0,0 +1,13 @@
+def test_venues_page_statements_do_not_grow_with_venues(client, seed, count_statements):
+    seed(3)
+    small = count_statements(lambda: client.get('/venues'))
+    seed(40)
+    large = count_statements(lambda: client.get('/venues'))
+    assert client.get('/venues').status_code == 200
+    assert small == large
+
+
+def test_venues_page_lists_every_area(client, seed):
+    seed(8)
+    page = client.get('/venues').get_data(as_text=True)
+    assert all(f'City {i}' in page for i in range(4))
@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+from app import statement_timeout
+
+
+class FakeConnection:
+    dialect = SimpleNamespace(name='postgresql')
+
+    def __init__(self):
+        self.statements = []
+
+    def exec_driver_sql(self, statement):
+        self.statements.append(statement)
+
+
+def test_web_request_transactions_get_the_timeout(app):
+    connection = FakeConnection()
+    with app.test_request_context('/venues'):
+        statement_timeout(None, None, connection)
+    assert connection.statements == [f'SET LOCAL statement_timeout = {app.config["DB_STATEMENT_TIMEOUT"]}']
+
+
+def test_cli_and_job_transactions_do_not(app):
+    connection = FakeConnection()
+    statement_timeout(None, None, connection)
+    assert connection.statements == []
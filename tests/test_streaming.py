@@ -0,0 +1,34 @@
+import re
+import queries
+
+
+def _stream(client, path, **args):
+    response = client.get(path, query_string=dict(args, stream='1'))
+    assert response.status_code == 200
+    assert response.is_streamed
+    return response.get_data(as_text=True)
+
+
+def test_streamed_listings_have_every_row_past_the_page_size(client, seed):
+    seed(60)
+    assert len(re.findall(r'>Artist \d+<', _stream(client, '/artists'))) == 60
+    assert len(re.findall(r'>Venue \d+<', _stream(client, '/venues'))) == 60
+    # one upcoming show per venue
+    assert len(re.findall(r'/artists/\d+"', _stream(client, '/shows'))) == 60
+
+
+def test_streamed_listing_reads_in_batches(client, seed, count_statements, monkeypatch):
+    seed(25)
+    monkeypatch.setattr(queries, 'STREAM_BATCH_SIZE', 4)
+    pages = []
+    statements = count_statements(lambda: pages.append(_stream(client, '/artists')))
+    # one query read through a cursor, whatever the number of batches
+    assert statements <= 3
+    assert re.findall(r'>(Artist \d+)<', pages[0]) == sorted(f'Artist {i}' for i in range(25))
+
+
+def test_streamed_shows_follow_the_filters(client, seed):
+    seed(8)
+    # the venues of seed() alternate between 4 cities of CA
+    assert len(re.findall(r'/artists/\d+"', _stream(client, '/shows', state='CA'))) == 8
+    assert not re.findall(r'/artists/\d+"', _stream(client, '/shows', state='NY'))
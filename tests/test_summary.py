@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from models import db, Venue, Show, VenueAreaSummary
+from summary import refresh_venues, rebuild, rollover
+
+
+def _summary():
+    return {row.venue_id: (row.state, row.city, row.name, row.num_upcoming_shows)
+            for row in VenueAreaSummary.query.order_by(VenueAreaSummary.venue_id)}
+
+
+def test_refresh_counts_upcoming_shows_of_the_venues_given(app, seed):
+    seed(3)
+    start = datetime.now() + timedelta(days=10)
+    db.session.add(Show(venue_id=2, artist_id=2, start_time=start, end_time=start + timedelta(hours=2)))
+    venue = db.session.get(Venue, 3)
+    venue.name, venue.city = 'Moved', 'Elsewhere'
+    db.session.flush()
+    refresh_venues([2])
+    assert _summary()[2][3] == 2
+    # venue 3 wasn't refreshed
+    assert _summary()[3] == ('CA', 'City 2', 'Venue 2', 1)
+    refresh_venues([3])
+    assert _summary()[3] == ('CA', 'Elsewhere', 'Moved', 1)
+
+
+def test_refresh_drops_the_rows_of_deleted_venues(app, seed):
+    seed(2, shows_per_venue=0)
+    db.session.delete(db.session.get(Venue, 1))
+    # the handlers flush before refreshing
+    db.session.flush()
+    refresh_venues([1])
+    assert list(_summary()) == [2]
+
+
+def test_rollover_refreshes_the_venues_whose_next_show_started(app, seed):
+    seed(3)
+    # seed() puts every venue's upcoming show 2 days ahead
+    start = datetime.now() + timedelta(days=5)
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=start, end_time=start + timedelta(hours=2)))
+    refresh_venues([1])
+    db.session.commit()
+    assert rollover(now=datetime.now()) == 0
+    assert rollover(now=datetime.now() + timedelta(days=3)) == 3
+    assert {id: row[3] for id, row in _summary().items()} == {1: 1, 2: 0, 3: 0}
+    # nothing left until venue 1's next show starts
+    assert rollover(now=datetime.now() + timedelta(days=3)) == 0
+
+
+def test_incremental_refreshes_match_a_rebuild(app, seed):
+    seed(6)
+    for venue_id in (1, 4):
+        start = datetime.now() + timedelta(days=venue_id)
+        db.session.add(Show(venue_id=venue_id, artist_id=venue_id, start_time=start,
+                            end_time=start + timedelta(hours=1)))
+    refresh_venues([1, 4])
+    db.session.commit()
+    later = datetime.now() + timedelta(days=2, hours=12)
+    rollover(now=later)
+    incremental = _summary()
+    rebuild(now=later)
+    assert _summary() == incremental
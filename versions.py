@@ -0,0 +1,66 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, PageVersion, Show
+
+# Versions of the catalog pages, for their ETags (conditional.py).
+#
+# page_version holds a counter per page, named by the page's cache tag: 'venues',
+# 'artists', 'shows', 'venue:<id>', 'artist:<id>'. A write bumps the counters of the pages
+# it changes with bump_versions(), in its own transaction: a page's version changes when
+# the write commits, never before. Reading the version of a page is a primary key lookup,
+# whatever the size of the tables behind the page.
+#
+# The writes: the handlers of app.py, the importer, every refresh of venue_area_summary
+# (summary.py bumps 'venues') and the counters rollover, for the shows that have started
+# (they leave /shows and become past shows of their venue and artist). Between two
+# rollovers a page keeps its version, as it keeps its cached copy.
+#
+# A venue page lists the names of its artists and an artist page the names of its venues:
+# venue_pages()/artist_pages() are the tags of all the pages a venue/artist appears on.
+
+
+def _upsert(dialect_name):
+    # a missing counter starts at 1, an existing one is incremented
+    if dialect_name == 'postgresql':
+        insert = postgresql.insert(PageVersion)
+    elif dialect_name == 'sqlite':
+        insert = sqlite.insert(PageVersion)
+    else:
+        return None
+    return insert.on_conflict_do_update(index_elements=['tag'],
+                                        set_={'version': PageVersion.__table__.c.version + 1})
+
+
+def bump_versions(*tags):
+    """Changes the version of the pages of `tags` in the current transaction."""
+    # always locked in the same order, concurrent writes bumping the same pages don't deadlock
+    tags = sorted(set(tags))
+    if not tags:
+        return
+    table = PageVersion.__table__
+    upsert = _upsert(db.engine.dialect.name)
+    if upsert is not None:
+        db.session.execute(upsert, [{'tag': tag, 'version': 1} for tag in tags])
+        return
+    db.session.execute(table.update().where(table.c.tag.in_(tags)).values(version=table.c.version + 1))
+    existing = {tag for tag, in db.session.query(PageVersion.tag).filter(PageVersion.tag.in_(tags))}
+    missing = [tag for tag in tags if tag not in existing]
+    if missing:
+        db.session.execute(table.insert(), [{'tag': tag, 'version': 1} for tag in missing])
+
+
+def page_versions(*tags):
+    """The versions of the pages of `tags`, in order, 0 for pages never changed."""
+    versions = dict(db.session.query(PageVersion.tag, PageVersion.version).filter(PageVersion.tag.in_(tags)))
+    return tuple(versions.get(tag, 0) for tag in tags)
+
+
+def venue_pages(venue_id):
+    """Tags of the pages showing venue `venue_id`: its own and those of its artists."""
+    artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+    return [f'venue:{venue_id}', *(f'artist:{id}' for id, in artist_ids)]
+
+
+def artist_pages(artist_id):
+    """Tags of the pages showing artist `artist_id`: its own and those of its venues."""
+    venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+    return [f'artist:{artist_id}', *(f'venue:{id}' for id, in venue_ids)]